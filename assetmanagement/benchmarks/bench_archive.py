@@ -0,0 +1,87 @@
+'''Time the borrow list queries on 500k loans, most of them returned years
+ago, before and after archive_loans moves the old ones to loan_archive.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_archive
+'''
+
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from assetmanagement.src.database import Database, Loan
+from assetmanagement.src.model import Model
+
+COUNT = 500000
+RECENT = 5000
+BORROWERS = 100
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    model = Model(database)
+    random.seed(0)
+    with model.batch():
+        for i in range(BORROWERS):
+            model.add_borrower(name='Borrower {:03}'.format(i))
+        model.add_asset(name='Pen', quantity=COUNT)
+    now = datetime.now()
+    old = now - timedelta(days=5 * 365)
+    with database.get_session() as session:
+        for first in range(0, COUNT, 10000):
+            loans = []
+            for i in range(first, first + 10000):
+                recent = i >= COUNT - RECENT
+                borrowed_at = now - timedelta(hours=COUNT - i) if recent \
+                    else old + timedelta(minutes=i)
+                loans.append({
+                    'borrower_id': random.randint(1, BORROWERS),
+                    'asset_id': 1,
+                    'quantity': 1,
+                    'datedue': (borrowed_at + timedelta(days=7)).date(),
+                    'is_returned': not recent or i % 2 == 0,
+                    'borrowed_at': borrowed_at,
+                    'returned_at': borrowed_at + timedelta(days=3)
+                        if not recent or i % 2 == 0 else None,
+                })
+            session.execute(Loan.__table__.insert(), loans)
+
+    queries = [
+        ('first page with count',
+            lambda: model.get_loans_page(count=True)),
+        ('active loans',
+            lambda: model.get_loans(active_only=True)),
+        ('overdue loans',
+            lambda: model.get_loans(overdue_only=True)),
+        ('loans of one borrower',
+            lambda: model.get_loans(borrower_name='Borrower 007')),
+        ('last week',
+            lambda: model.get_loans(since=date.today() - timedelta(days=7))),
+    ]
+
+    def run():
+        times = []
+        for _, query in queries:
+            query()
+            times.append(timed(query)[0])
+        return times
+
+    before = run()
+    archive_time, archived = timed(model.archive_loans)
+    after = run()
+    print('{} loans, {} archived in {:.1f}s'.format(
+        COUNT, archived, archive_time / 1000))
+    print('{:<28}{:>14}{:>14}'.format('query', 'before (ms)', 'after (ms)'))
+    for (name, _), first, second in zip(queries, before, after):
+        print('{:<28}{:>14.1f}{:>14.1f}'.format(name, first, second))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''Compare a 90 day availability calendar of 5k assets built at once by
+get_availability_calendar against one get_availability_forecast per asset.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_availability
+'''
+
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from assetmanagement.src.analytics import get_availability_calendar
+from assetmanagement.src.database import Asset, Database, Loan
+from assetmanagement.src.model import Model
+
+ASSETS = 5000
+LOANS = 200000
+DAYS = 90
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    random.seed(0)
+    today = date.today()
+    with database.get_session() as session:
+        session.execute(Asset.__table__.insert(), [
+            {'name': 'Asset {:04}'.format(i), 'total': 100, 'instock': 50}
+            for i in range(ASSETS)
+        ])
+        session.execute(
+            "INSERT INTO borrower (name, is_active) VALUES ('Amy', 1)")
+        session.execute(Loan.__table__.insert(), [
+            {
+                'borrower_id': 1,
+                'asset_id': random.randint(1, ASSETS),
+                'quantity': random.randint(1, 3),
+                'datedue': today + timedelta(days=random.randint(-10, 120)),
+                'is_returned': False,
+            }
+            for _ in range(LOANS)
+        ])
+    model = Model(database)
+
+    def one_by_one():
+        return [
+            model.get_availability_forecast(name, days=DAYS)
+            for name, _, _ in model.get_assets()
+        ]
+
+    calendar_time, calendar = timed(
+        lambda: get_availability_calendar(database, days=DAYS))
+    loop_time, forecasts = timed(one_by_one)
+    assert [[instock for _, instock in forecast] for forecast in forecasts] \
+        == calendar.instock.tolist()
+    print('{} assets, {} active loans, {} days'.format(ASSETS, LOANS, DAYS))
+    print('{:<36}{:>12}'.format('method', 'time (ms)'))
+    print('{:<36}{:>12.1f}'.format(
+        'get_availability_calendar', calendar_time))
+    print('{:<36}{:>12.1f}'.format(
+        'get_availability_forecast per asset', loop_time))
+
+if __name__ == '__main__':
+    main()
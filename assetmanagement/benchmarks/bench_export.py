@@ -0,0 +1,68 @@
+'''Compare peak RSS of exporting 10k and 1M loans.
+
+Each size runs in a fresh subprocess, since peak RSS never goes down within
+one process. The loans are inserted before the baseline RSS is taken, so
+the reported growth is what the export itself costs.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_export
+'''
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from assetmanagement.src.database import Database, Loan
+from assetmanagement.src.model import Model
+
+SIZES = (10000, 1000000)
+
+def peak_rss_kib():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def bench_size(count):
+    directory = tempfile.mkdtemp()
+    # the 'fast' profile memory-maps the file, and mapped pages would show
+    # up in RSS although they are not allocated by the export
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'),
+        profile='durable')
+    model = Model(database)
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=1)
+    loan = {
+        'borrower_id': 1,
+        'asset_id': 1,
+        'quantity': 1,
+        'datedue': date(2020, 1, 1),
+        'is_returned': True,
+    }
+    with database.get_session() as session:
+        for _ in range(0, count, 10000):
+            session.execute(Loan.__table__.insert(), [loan] * 10000)
+
+    baseline = peak_rss_kib()
+    start = time.perf_counter()
+    model.export_loans(os.path.join(directory, 'loans.csv'))
+    elapsed = time.perf_counter() - start
+    print('{:>10}{:>16}{:>16}{:>12.2f}'.format(
+        count, baseline, peak_rss_kib() - baseline, elapsed))
+
+def main():
+    if len(sys.argv) > 1:
+        bench_size(int(sys.argv[1]))
+        return
+    print('{:>10}{:>16}{:>16}{:>12}'.format(
+        'loans', 'base RSS (KiB)', 'growth (KiB)', 'time (s)'))
+    sys.stdout.flush()
+    for count in SIZES:
+        subprocess.run([sys.executable, '-m', __spec__.name, str(count)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''Compare get_asset and get_assets served from the inventory snapshot with
+the same reads done in SQL, on an in-memory and a file database with 200
+assets.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_inventory
+'''
+
+import os
+import tempfile
+import time
+
+from assetmanagement.src.database import Asset, Database
+from assetmanagement.src.model import Model
+
+ROUNDS = 2000
+ASSETS = 200
+
+def sql_get_asset(model, name):
+    with model.database.get_session() as session:
+        return (
+            session.query(Asset.name, Asset.total, Asset.instock)
+            .filter_by(name=name)
+            .one()
+        )
+
+def sql_get_assets(model):
+    with model.database.get_session() as session:
+        return (
+            session.query(Asset.name, Asset.total, Asset.instock)
+            .filter(Asset.instock > 0)
+            .order_by(Asset.name)
+            .all()
+        )
+
+def timed(function):
+    function()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        function()
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+def bench(label, engine):
+    model = Model(Database(engine))
+    with model.batch():
+        for i in range(ASSETS):
+            model.add_asset(name='asset{:03d}'.format(i), quantity=10)
+    cases = [
+        ('get_asset',
+            lambda: sql_get_asset(model, 'asset100'),
+            lambda: model.get_asset('asset100')),
+        ('get_assets(instock)',
+            lambda: sql_get_assets(model),
+            lambda: model.get_assets(instock_only=True)),
+    ]
+    for name, sql, snapshot in cases:
+        print('{:<10}{:<22}{:>12.1f}{:>16.1f}'.format(
+            label, name, timed(sql), timed(snapshot)))
+
+def main():
+    print('{:<10}{:<22}{:>12}{:>16}'.format(
+        'database', 'call', 'sql (us)', 'snapshot (us)'))
+    bench('memory', 'sqlite:///:memory:')
+    directory = tempfile.mkdtemp()
+    bench('file', 'sqlite:///' + os.path.join(
+        directory, 'equipmentmanagement.db'))
+
+if __name__ == '__main__':
+    main()
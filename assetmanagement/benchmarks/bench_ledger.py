@@ -0,0 +1,80 @@
+'''Time get_assets(as_of=...) as the asset ledger grows from 100k to 1M
+entries, against replaying the whole ledger up to the same moment. Then,
+with all 1M entries, time it again for the moments taken at each size, so
+looking far back is measured as well as looking at now.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_ledger
+'''
+
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from assetmanagement.src.database import Database
+from assetmanagement.src.model import Model
+
+ASSETS = 50
+STEPS = [100000, 300000, 1000000]
+
+FULL_REPLAY = (
+    'SELECT asset.name, sum(total_delta), sum(instock_delta) '
+    'FROM asset_ledger JOIN asset ON asset.id = asset_ledger.asset_id '
+    'WHERE asset_ledger.at <= ? GROUP BY asset.name ORDER BY asset.name'
+)
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+def grow(database, count):
+    # plain updates of asset, which the ledger triggers record one by one
+    with database.engine.begin() as connection:
+        connection.execute(
+            'UPDATE asset SET instock = instock + ? WHERE id = ?',
+            [(-(-1) ** (i // ASSETS), i % ASSETS + 1) for i in range(count)])
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    model = Model(database)
+    with model.batch():
+        for i in range(ASSETS):
+            model.add_asset(name='Asset {:02}'.format(i), quantity=10)
+
+    def compare(as_of):
+        def full_replay():
+            with database.engine.connect() as connection:
+                return connection.execute(FULL_REPLAY, str(as_of)).fetchall()
+
+        model.get_assets(as_of=as_of)
+        ledger_time, assets = timed(lambda: model.get_assets(as_of=as_of))
+        replay_time, rows = timed(full_replay)
+        assert assets == [tuple(row) for row in rows]
+        return ledger_time, replay_time
+
+    size = ASSETS
+    moments = []
+    print('{:>10}{:>18}{:>18}'.format(
+        'entries', 'as_of (ms)', 'full replay (ms)'))
+    for step in STEPS:
+        grow(database, step - size)
+        size = step
+        time.sleep(0.01)
+        moments.append((size, datetime.now()))
+        time.sleep(0.01)
+        print('{:>10}{:>18.2f}{:>18.2f}'.format(
+            size, *compare(moments[-1][1])))
+
+    print()
+    print('with {} entries'.format(size))
+    print('{:>10}{:>18}{:>18}'.format(
+        'as_of at', 'as_of (ms)', 'full replay (ms)'))
+    for entries, as_of in moments:
+        print('{:>10}{:>18.2f}{:>18.2f}'.format(entries, *compare(as_of)))
+
+if __name__ == '__main__':
+    main()
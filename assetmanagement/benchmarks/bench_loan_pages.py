@@ -0,0 +1,76 @@
+'''Compare fetching all loans with fetching pages of them.
+
+The borrow list used to load every loan before showing any. With 300k
+loans, this times get_loans against the first page the dialog shows, a
+page deep into the history via the keyset cursor, and the same deep page
+fetched with OFFSET for reference.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_loan_pages
+'''
+
+import os
+import tempfile
+import time
+from datetime import date
+
+from assetmanagement.src.database import Database, Loan
+from assetmanagement.src.model import LOAN_PAGE_SIZE, Model
+
+COUNT = 300000
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    model = Model(database)
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=1)
+    loan = {
+        'borrower_id': 1,
+        'asset_id': 1,
+        'quantity': 1,
+        'datedue': date(2020, 1, 1),
+        'is_returned': True,
+    }
+    with database.get_session() as session:
+        for _ in range(0, COUNT, 10000):
+            session.execute(Loan.__table__.insert(), [loan] * 10000)
+    model.get_loans_page()
+    depth = COUNT - 10 * LOAN_PAGE_SIZE
+
+    def offset_page():
+        with database.get_session() as session:
+            return (
+                session.query(Loan.quantity)
+                .order_by(Loan.id)
+                .offset(depth)
+                .limit(LOAN_PAGE_SIZE)
+                .all()
+            )
+
+    rows = [
+        ('get_loans()', lambda: model.get_loans()),
+        ('first page + count',
+            lambda: model.get_loans_page(count=True)),
+        ('first page', lambda: model.get_loans_page()),
+        # a cursor is the id of the last loan of the previous page
+        ('deep page (keyset)',
+            lambda: model.get_loans_page(after=depth)),
+        ('deep page (OFFSET)', offset_page),
+    ]
+    print('{:<24}{:>12}{:>10}'.format('call', 'time (ms)', 'rows'))
+    for name, function in rows:
+        elapsed, result = timed(function)
+        if hasattr(result, 'loans'):
+            result = result.loans
+        print('{:<24}{:>12.1f}{:>10}'.format(
+            name, elapsed * 1000, len(result)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''Compare a one-week history query on 1M loans spread over three years,
+using ix_loan_borrowed_at and forcing a full scan of loan.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_loan_window
+'''
+
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from assetmanagement.src.database import Database, Loan
+from assetmanagement.src.model import Model
+
+COUNT = 1000000
+START = datetime(2020, 1, 1)
+SPAN = timedelta(days=3 * 365)
+SINCE = date(2021, 6, 1)
+UNTIL = date(2021, 6, 8)
+
+FULL_SCAN = (
+    'SELECT borrower.name, asset.name, loan.quantity, loan.datedue, '
+    'loan.is_returned FROM loan NOT INDEXED '
+    'JOIN borrower ON borrower.id = loan.borrower_id '
+    'JOIN asset ON asset.id = loan.asset_id '
+    'WHERE loan.borrowed_at >= ? AND loan.borrowed_at < ?'
+)
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    model = Model(database)
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=1)
+    step = SPAN / COUNT
+    with database.get_session() as session:
+        for first in range(0, COUNT, 10000):
+            session.execute(Loan.__table__.insert(), [
+                {
+                    'borrower_id': 1,
+                    'asset_id': 1,
+                    'quantity': 1,
+                    'datedue': date(2020, 1, 1),
+                    'is_returned': True,
+                    'borrowed_at': START + step * i,
+                }
+                for i in range(first, first + 10000)
+            ])
+
+    def full_scan():
+        # the same strings SQLAlchemy binds for the DateTime column
+        with database.engine.connect() as connection:
+            return connection.execute(FULL_SCAN, (
+                str(datetime.combine(SINCE, datetime.min.time())) + '.000000',
+                str(datetime.combine(UNTIL, datetime.min.time())) + '.000000',
+            )).fetchall()
+
+    model.get_loans(since=SINCE, until=UNTIL)
+    index_time, loans = timed(
+        lambda: model.get_loans(since=SINCE, until=UNTIL))
+    scan_time, rows = timed(full_scan)
+    assert len(rows) == len(loans)
+    print('{} loans, {} in the window'.format(COUNT, len(loans)))
+    print('{:<28}{:>12}'.format('query', 'time (ms)'))
+    print('{:<28}{:>12.1f}'.format('get_loans(since, until)', index_time))
+    print('{:<28}{:>12.1f}'.format('full scan', scan_time))
+
+if __name__ == '__main__':
+    main()
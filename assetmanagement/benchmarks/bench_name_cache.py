@@ -0,0 +1,56 @@
+'''Compare statements and time per borrow/return with and without the
+name to id cache of Model.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_name_cache
+'''
+
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from assetmanagement.src.database import Database
+from assetmanagement.src.model import NAME_CACHE_SIZE, Model
+
+ROUNDS = 2000
+
+def bench(name_cache_size):
+    database = Database('sqlite:///:memory:')
+    model = Model(database, name_cache_size=name_cache_size)
+    for i in range(100):
+        model.add_borrower(name='borrower{}'.format(i))
+        model.add_asset(name='asset{}'.format(i), quantity=10)
+    datedue = date.today() + timedelta(days=7)
+    statements = []
+    event.listen(
+        database.engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2])
+    )
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        borrower_name = 'borrower{}'.format(i % 100)
+        asset_name = 'asset{}'.format(i % 100)
+        model.borrow_asset(borrower_name, asset_name, 1, datedue)
+        model.return_asset(borrower_name, asset_name)
+    elapsed = time.perf_counter() - start
+
+    selects = sum(1 for s in statements if s.lstrip().startswith('SELECT'))
+    print('{:<12}{:>16.2f}{:>16.2f}{:>16.1f}{:>10.0%}'.format(
+        'on' if name_cache_size else 'off',
+        len(statements) / ROUNDS,
+        selects / ROUNDS,
+        elapsed / ROUNDS * 1e6,
+        model.asset_ids.hits / max(
+            1, model.asset_ids.hits + model.asset_ids.misses)))
+
+def main():
+    print('{:<12}{:>16}{:>16}{:>16}{:>10}'.format(
+        'name cache', 'statements', 'SELECTs', 'time (us)', 'hit rate'))
+    bench(0)
+    bench(NAME_CACHE_SIZE)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+'''Time search_borrowers as a user types, with 100k borrowers, using the
+FTS5 index and the LIKE fallback, against get_borrower_names. Every word
+goes through the index, however short, so names split on punctuation
+match the same from the first letter on; one-letter prefixes cost more
+there than the scan of the names in order that LIKE stops early.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_name_search
+'''
+
+import random
+import time
+
+from assetmanagement.src.database import Borrower, Database
+from assetmanagement.src.model import Model
+
+COUNT = 100000
+SYLLABLES = ['an', 'be', 'ca', 'do', 'el', 'fi', 'go', 'ha', 'is', 'jo',
+    'ka', 'li', 'mo', 'na', 'or', 'pe', 'ri', 'sa', 'ta', 'vi']
+TYPED = ['s', 'sa', 'sam', 'sa mo', 's mo', 'samoli ka']
+
+def random_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+def timed(function, rounds=20):
+    function()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds * 1000, result
+
+def main():
+    rng = random.Random(0)
+    database = Database('sqlite:///:memory:')
+    names = {
+        '{} {}'.format(random_word(rng), random_word(rng)).title()
+        for _ in range(COUNT)
+    }
+    with database.get_session() as session:
+        session.execute(Borrower.__table__.insert(), [
+            {'name': name, 'is_active': True} for name in names
+        ])
+    model = Model(database)
+
+    elapsed, result = timed(model.get_borrower_names, rounds=3)
+    print('get_borrower_names: {:.1f} ms for {} names'.format(
+        elapsed, len(result)))
+    print('{:<12}{:>12}{:>12}{:>10}'.format(
+        'typed', 'fts5 (ms)', 'like (ms)', 'matches'))
+    for text in TYPED:
+        model.database.name_search = True
+        fts_time, fts_result = timed(lambda: model.search_borrowers(text))
+        matches = len(model.search_borrowers(text, limit=COUNT))
+        model.database.name_search = False
+        like_time, like_result = timed(
+            lambda: model.search_borrowers(text), rounds=3)
+        assert fts_result == like_result
+        print('{:<12}{:>12.2f}{:>12.2f}{:>10}'.format(
+            repr(text), fts_time, like_time, matches))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''Time the notification of 1, 10 and 100 observers of an observable method,
+for observers taking nothing, the call arguments, or the published changes.
+The plain calls row is the cost of the observable method itself with no
+observers. Then time getting the observable bound method, cached on the
+instance by the default strategy and built on every access by the
+descriptor strategy. Last, time the calls with 100 observers when a
+NotificationDispatcher delivers the notifications on its own thread: the
+calls return without waiting for the observers.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_observers
+'''
+
+import time
+
+from assetmanagement.src.observable import (NotificationDispatcher,
+                                            dispatch_notifications,
+                                            observable_method, publish_change,
+                                            wait_for_notifications)
+
+CALLS = 20000
+OBSERVERS = (1, 10, 100)
+
+
+class Subject:
+    @observable_method()
+    def change(self, value):
+        publish_change(self, value)
+
+
+class DescriptorSubject:
+    @observable_method(strategy='descriptor')
+    def change(self, value):
+        pass
+
+
+class View:
+    def __init__(self):
+        self.count = 0
+
+    def refresh(self):
+        self.count += 1
+
+    def update(self, value):
+        self.count += 1
+
+    def patch(self, changes):
+        self.count += 1
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000000 / CALLS
+
+def notify(subject):
+    change = subject.change
+    for i in range(CALLS):
+        change(i)
+
+def access(subject):
+    for i in range(CALLS):
+        subject.change
+
+def time_observers(count, method, dispatcher=None, **flags):
+    subject = Subject()
+    if dispatcher is not None:
+        dispatch_notifications(subject, dispatcher)
+    views = [View() for _ in range(count)]
+    for view in views:
+        subject.change.add_observer(getattr(view, method), **flags)
+    elapsed = timed(lambda: notify(subject))
+    wait_for_notifications(subject)
+    assert all(view.count == CALLS for view in views)
+    return elapsed
+
+def main():
+    print('{:<12}{:>16}{:>16}{:>16}'.format(
+        'observers', 'nothing (us)', 'arguments (us)', 'changes (us)'))
+    print('{:<12}{:>16.2f}'.format(
+        'plain calls', timed(lambda: notify(Subject()))))
+    for count in OBSERVERS:
+        print('{:<12}{:>16.2f}{:>16.2f}{:>16.2f}'.format(
+            count,
+            time_observers(count, 'refresh', pass_arguments=False),
+            time_observers(count, 'update'),
+            time_observers(
+                count, 'patch', pass_arguments=False, pass_changes=True),
+        ))
+    print()
+    print('{:<28}{:>16}'.format('access', 'time (us)'))
+    print('{:<28}{:>16.3f}'.format(
+        'cached on the instance', timed(lambda: access(Subject()))))
+    print('{:<28}{:>16.3f}'.format(
+        'built by the descriptor', timed(lambda: access(DescriptorSubject()))))
+    print()
+    print('{:<28}{:>16}'.format('100 observers', 'call (us)'))
+    print('{:<28}{:>16.2f}'.format(
+        'notified synchronously',
+        time_observers(100, 'refresh', pass_arguments=False)))
+    dispatcher = NotificationDispatcher()
+    print('{:<28}{:>16.2f}'.format(
+        'notified by a dispatcher',
+        time_observers(
+            100, 'refresh', dispatcher=dispatcher, pass_arguments=False)))
+    dispatcher.shutdown()
+
+if __name__ == '__main__':
+    main()
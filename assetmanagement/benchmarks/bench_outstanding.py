@@ -0,0 +1,91 @@
+'''Compare summing outstanding quantities in Python with get_outstanding
+and get_overdue_summary, on 100k active loans over 1000 borrowers and
+100 assets.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_outstanding
+'''
+
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from assetmanagement.src.database import (Asset, Borrower, Database, Loan,
+                                          rebuild_outstanding)
+from assetmanagement.src.model import Model
+
+COUNT = 100000
+BORROWERS = 1000
+ASSETS = 100
+
+def setup():
+    database = Database('sqlite:///:memory:')
+    today = date.today()
+    with database.get_session() as session:
+        session.execute(Borrower.__table__.insert(), [
+            {'name': 'borrower{}'.format(i), 'is_active': True}
+            for i in range(BORROWERS)
+        ])
+        session.execute(Asset.__table__.insert(), [
+            {'name': 'asset{}'.format(i), 'total': COUNT, 'instock': 0}
+            for i in range(ASSETS)
+        ])
+        session.execute(Loan.__table__.insert(), [
+            {
+                'borrower_id': i % BORROWERS + 1,
+                'asset_id': i % ASSETS + 1,
+                'quantity': 1,
+                'datedue': today + timedelta(days=i % 7 - 3),
+                'is_returned': False,
+            }
+            for i in range(COUNT)
+        ])
+        rebuild_outstanding(session.connection())
+    return Model(database)
+
+def python_by_asset(model):
+    count = Counter()
+    for _, asset_name, quantity, _, _ in model.get_loans(active_only=True):
+        count[asset_name] += quantity
+    return sorted(count.items())
+
+def python_by_borrower(model, asset_name):
+    count = Counter()
+    for borrower_name, _, quantity, _, _ in model.get_loans(
+            asset_name=asset_name, active_only=True):
+        count[borrower_name] += quantity
+    return sorted(count.items())
+
+def python_overdue(model):
+    count = Counter()
+    for borrower_name, _, _, _, _ in model.get_loans(overdue_only=True):
+        count[borrower_name] += 1
+    return len(count)
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    model = setup()
+    assert python_by_asset(model) == model.get_outstanding(by='asset')
+    cases = [
+        ('by asset',
+            lambda: python_by_asset(model),
+            lambda: model.get_outstanding(by='asset')),
+        ('who holds asset7',
+            lambda: python_by_borrower(model, 'asset7'),
+            lambda: model.get_outstanding(
+                by='borrower', asset_name='asset7')),
+        ('overdue by borrower',
+            lambda: python_overdue(model),
+            lambda: model.get_overdue_summary()),
+    ]
+    print('{:<24}{:>14}{:>14}'.format('query', 'python (ms)', 'sql (ms)'))
+    for name, python, sql in cases:
+        print('{:<24}{:>14.1f}{:>14.1f}'.format(
+            name, timed(python), timed(sql)))
+
+if __name__ == '__main__':
+    main()
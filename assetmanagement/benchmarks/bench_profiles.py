@@ -0,0 +1,54 @@
+'''Compare commit latency of the database profiles.
+
+Every borrow and return is its own transaction, so the cost of a commit is
+what the front desk waits for. Each profile gets a fresh file-backed
+equipmentmanagement.db in a temporary directory.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_profiles
+'''
+
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from assetmanagement.src.database import PROFILES, Database
+from assetmanagement.src.model import Model
+
+ROUNDS = 200
+
+def bench_profile(directory, profile):
+    path = os.path.join(directory, profile, 'equipmentmanagement.db')
+    os.makedirs(os.path.dirname(path))
+    model = Model(Database('sqlite:///' + path, profile=profile))
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    datedue = date.today() + timedelta(days=7)
+
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        model.borrow_asset('Amy', 'Pen', 1, datedue)
+        latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        model.return_asset('Amy', 'Pen')
+        latencies.append(time.perf_counter() - start)
+    model.database.engine.dispose()
+    return latencies
+
+def main():
+    print('{:<10}{:>12}{:>12}{:>12}'.format(
+        'profile', 'mean (ms)', 'p50 (ms)', 'p99 (ms)'))
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PROFILES:
+            latencies = sorted(bench_profile(directory, profile))
+            print('{:<10}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+                profile,
+                statistics.mean(latencies) * 1000,
+                latencies[len(latencies) // 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000))
+
+if __name__ == '__main__':
+    main()
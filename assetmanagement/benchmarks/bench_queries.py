@@ -0,0 +1,69 @@
+'''Compare per-call overhead of the read paths with and without the cached
+(baked) queries.
+
+The tables are tiny and in memory, so the time is almost all Python:
+building the Query and compiling it to SQL. Turning off
+enable_baked_queries on the sessions makes the same code build and compile
+a fresh Query on every call, which is what it did before.
+
+get_asset and get_assets are left out: they were single-table lookups
+that baking didn't speed up, and are served from the inventory now (see
+bench_inventory).
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_queries
+'''
+
+import statistics
+import time
+from datetime import date, timedelta
+
+from assetmanagement.src.database import Database
+from assetmanagement.src.model import Model
+
+ROUNDS = 2000
+
+CALLS = [
+    ('get_loans()', lambda model: model.get_loans()),
+    ('get_loans(borrower)',
+        lambda model: model.get_loans(borrower_name='Amy')),
+    ('get_loans(asset, overdue)',
+        lambda model: model.get_loans(asset_name='Pen', overdue_only=True)),
+    ('get_borrower_names', lambda model: model.get_borrower_names()),
+]
+
+def setup(enable_baked_queries):
+    database = Database('sqlite:///:memory:')
+    database.Session.configure(enable_baked_queries=enable_baked_queries)
+    model = Model(database)
+    for name in ('Amy', 'Bob'):
+        model.add_borrower(name=name)
+    for name in ('Pen', 'Marker'):
+        model.add_asset(name=name, quantity=10)
+    model.borrow_asset('Amy', 'Pen', 1, date.today() - timedelta(days=1))
+    model.borrow_asset('Bob', 'Marker', 1, date.today() + timedelta(days=7))
+    return model
+
+def bench(model, call):
+    call(model)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        call(model)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+def main():
+    plain = setup(False)
+    cached = setup(True)
+    print('{:<28}{:>12}{:>12}{:>10}'.format(
+        'call', 'plain (us)', 'cached (us)', 'speedup'))
+    speedups = []
+    for name, call in CALLS:
+        plain_time = bench(plain, call)
+        cached_time = bench(cached, call)
+        speedups.append(plain_time / cached_time)
+        print('{:<28}{:>12.1f}{:>12.1f}{:>9.2f}x'.format(
+            name, plain_time, cached_time, speedups[-1]))
+    print('median speedup: {:.2f}x'.format(statistics.median(speedups)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''Time availability checks among 100k reservations: Model.reserve, and the
+peak demand of a range from ReservationIndex against summing the
+overlapping reservations fetched by SQL.
+
+Run from the repository root:
+    PYTHONPATH=assetmanagement/src python -m assetmanagement.benchmarks.bench_reservations
+'''
+
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from assetmanagement.src.database import Asset, Database, Reservation
+from assetmanagement.src.model import Model
+
+COUNT = 100000
+ASSETS = 100
+DAYS = 2 * 365
+CHECKS = 1000
+
+OVERLAPPING = (
+    'SELECT datefrom, dateto, quantity FROM reservation '
+    'WHERE asset_id = ? AND dateto >= ? AND datefrom <= ?'
+)
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1000, result
+
+def random_range(rng):
+    first = date.today() + timedelta(days=rng.randint(0, DAYS))
+    return first, first + timedelta(days=rng.randint(0, 14))
+
+def sql_peak(connection, asset_id, first, last):
+    # what a check without the index does: add up every overlapping booking
+    demand = defaultdict(int)
+    for datefrom, dateto, quantity in connection.execute(
+            OVERLAPPING, (asset_id, str(first), str(last))):
+        datefrom = max(date.fromisoformat(datefrom), first)
+        dateto = min(date.fromisoformat(dateto), last)
+        for n in range((dateto - datefrom).days + 1):
+            demand[datefrom + timedelta(days=n)] += quantity
+    return max(demand.values(), default=0)
+
+def main():
+    directory = tempfile.mkdtemp()
+    database = Database(
+        'sqlite:///' + os.path.join(directory, 'equipmentmanagement.db'))
+    rng = random.Random(0)
+    with database.get_session() as session:
+        session.execute(Asset.__table__.insert(), [
+            {'name': 'Asset {:03}'.format(i), 'total': 1000, 'instock': 1000}
+            for i in range(ASSETS)
+        ])
+        session.execute(
+            "INSERT INTO borrower (name, is_active) VALUES ('Amy', 1)")
+        reservations = []
+        for _ in range(COUNT):
+            first, last = random_range(rng)
+            reservations.append({
+                'borrower_id': 1,
+                'asset_id': rng.randint(1, ASSETS),
+                'quantity': rng.randint(1, 3),
+                'datefrom': first,
+                'dateto': last,
+            })
+        session.execute(Reservation.__table__.insert(), reservations)
+    model = Model(database)
+
+    first, last = random_range(rng)
+    load_time, _ = timed(
+        lambda: model.reserve('Amy', 'Asset 000', 1, first, last))
+
+    def reserve_many():
+        refused = 0
+        for _ in range(CHECKS):
+            first, last = random_range(rng)
+            try:
+                model.reserve(
+                    'Amy', 'Asset {:03}'.format(rng.randrange(ASSETS)),
+                    1, first, last)
+            except IntegrityError:
+                refused += 1
+        return refused
+    reserve_time, _ = timed(reserve_many)
+
+    checks = []
+    for _ in range(CHECKS):
+        first, last = random_range(rng)
+        checks.append((rng.randint(1, ASSETS), first, last))
+    index = model.reservations
+    index_time, index_peaks = timed(lambda: [
+        index.get_peak(asset_id, first, last)
+        for asset_id, first, last in checks
+    ])
+    connection = database.engine.raw_connection()
+    try:
+        sql_time, sql_peaks = timed(lambda: [
+            sql_peak(connection, asset_id, first, last)
+            for asset_id, first, last in checks
+        ])
+    finally:
+        connection.close()
+    assert index_peaks == sql_peaks
+
+    print('{} reservations over {} assets'.format(COUNT, ASSETS))
+    print('{:<36}{:>12}'.format('step', 'time (ms)'))
+    print('{:<36}{:>12.1f}'.format('first reserve (loads the index)',
+        load_time))
+    print('{:<36}{:>12.3f}'.format('reserve', reserve_time / CHECKS))
+    print('{:<36}{:>12.3f}'.format('peak from ReservationIndex',
+        index_time / CHECKS))
+    print('{:<36}{:>12.3f}'.format('peak from overlapping rows',
+        sql_time / CHECKS))
+
+if __name__ == '__main__':
+    main()
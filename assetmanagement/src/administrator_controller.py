@@ -5,7 +5,7 @@ from administrator_view import AdministratorView
 from model import ModelError
 from new_passcode_controller import NewPasscodeController
 from passcode_controller import PasscodeController
-from utils import error_message
+from utils import enable_search, error_message
 
 class AdministratorController:
     def __init__(self, model):
@@ -13,6 +13,15 @@ class AdministratorController:
         self.view = AdministratorView(self.dialog)
         self.model = model
 
+        enable_search(
+            self.view.comboBox_Borrower,
+            lambda text: self.model.search_borrowers(text, active_only=True)
+        )
+        enable_search(
+            self.view.comboBox_Asset,
+            lambda text: self.model.search_assets(text, active_only=True)
+        )
+
         self.view.pushButton_ChangePasscode.clicked \
             .connect(self.change_passcode_verify)
         self.view.pushButton_AddBorrower.clicked \
@@ -36,6 +45,10 @@ class AdministratorController:
             self.update_borrower_combobox,
             pass_arguments=False
         )
+        self.model.import_borrowers.add_observer(
+            self.update_borrower_combobox,
+            pass_arguments=False
+        )
         self.model.add_asset.add_observer(
             self.update_asset_combobox,
             pass_arguments=False
@@ -44,6 +57,10 @@ class AdministratorController:
             self.update_asset_combobox,
             pass_arguments=False
         )
+        self.model.import_assets.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
 
     def change_passcode_verify(self):
         self.passcode_controller = PasscodeController(self.model)
@@ -76,13 +93,12 @@ class AdministratorController:
         self.view.clear_remove_asset_spinbox()
 
     def update_borrower_combobox(self):
-        borrower_names = self.model.get_borrower_names(active_only=True)
+        borrower_names = self.model.search_borrowers('', active_only=True)
         self.view.update_borrower_combobox(borrower_names)
         self.view.deselect_borrower_combobox()
 
     def update_asset_combobox(self):
-        assets = self.model.get_assets(active_only=True)
-        asset_names = [asset[0] for asset in assets]
+        asset_names = self.model.search_assets('', active_only=True)
         self.view.update_asset_combobox(asset_names)
         self.view.deselect_asset_combobox()
 
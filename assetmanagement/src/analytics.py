@@ -0,0 +1,350 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import (Date, Integer, and_, bindparam, cast, func, or_,
+                        select, union_all)
+
+from database import Asset, Loan, LoanArchive
+from model import FORECAST_DAYS, LOAN_CHUNK_SIZE, as_datetime
+
+# name (str), total (int): the asset and its current total.
+# utilization (float): the average fraction of total out on loan over the
+#     window, or None if total is 0.
+# peak (int): the most units out on loan at the same time.
+# average_loan (timedelta): the average length of returned loans,
+#     or None if none were returned.
+Utilization = namedtuple(
+    'Utilization', ['name', 'total', 'utilization', 'peak', 'average_loan'])
+
+# names (list of str): asset names, sorted.
+# dates (list of date): the days projected, from today.
+# instock (ndarray): projected instock of each asset (row) on each day
+#     (column), as Model.get_availability_forecast.
+AvailabilityCalendar = namedtuple(
+    'AvailabilityCalendar', ['names', 'dates', 'instock'])
+
+# Loan intervals fetch asset_id * _PACK + quantity as one integer.
+_PACK = 2 ** 32
+
+_asset = Asset.__table__
+_loan = Loan.__table__
+_loan_archive = LoanArchive.__table__
+
+def _to_ms(value):
+    return int((as_datetime(value) - datetime(1970, 1, 1))
+        // timedelta(milliseconds=1))
+
+def _get_index(ids, asset_ids):
+    # position in ids of each of asset_ids, all of which are in ids
+    order = np.argsort(ids)
+    return order[np.searchsorted(ids, asset_ids, sorter=order)]
+
+def _fetch_array(result, columns, chunk_size=LOAN_CHUNK_SIZE):
+    # Read the DBAPI cursor directly. Plain tuples convert to arrays
+    # several times faster than result rows.
+    cursor = result.cursor
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.int64))
+    if not chunks:
+        return np.empty((0, columns), dtype=np.int64)
+    return np.concatenate(chunks)
+
+def _fetch_intervals(result, chunk_size=LOAN_CHUNK_SIZE):
+    # Like _fetch_array, for rows of _select_loan_intervals. NumPy parses
+    # the times as datetime64, then they are read as their int64 epoch
+    # milliseconds, with -1 for NULL (NaT).
+    cursor = result.cursor
+    keys, starts, ends = [], [], []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        key, start, end = zip(*rows)
+        keys.append(np.array(key, dtype=np.int64))
+        starts.append(np.array(start, dtype='datetime64[ms]'))
+        ends.append(np.array(end, dtype='datetime64[ms]'))
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    key = np.concatenate(keys)
+    end = np.concatenate(ends)
+    return (
+        key // _PACK,
+        key % _PACK,
+        np.concatenate(starts).view(np.int64),
+        np.where(np.isnat(end), -1, end.view(np.int64))
+    )
+
+GET_ASSET_TOTALS = select([_asset.c.id, _asset.c.name, _asset.c.total]) \
+    .order_by(_asset.c.name)
+GET_ASSET_INSTOCK = select([_asset.c.id, _asset.c.name, _asset.c.instock]) \
+    .order_by(_asset.c.name)
+# Quantity due back per asset and day of [first, last], counted in days
+# from first. Uses ix_loan_returned_datedue.
+GET_DUE = (
+    select([
+        _loan.c.asset_id,
+        cast(
+            func.julianday(_loan.c.datedue)
+            - func.julianday(bindparam('first', type_=Date)),
+            Integer
+        ),
+        func.sum(_loan.c.quantity),
+    ])
+    .where(and_(
+        _loan.c.is_returned == False,
+        _loan.c.datedue >= bindparam('first'),
+        _loan.c.datedue <= bindparam('last')
+    ))
+    .group_by(_loan.c.asset_id, _loan.c.datedue)
+)
+def _select_loan_intervals(table):
+    # Loans overlapping [since, until). Loans with unknown times are left
+    # out. Fetching each value costs more than anything SQLite does with
+    # it, so asset_id and quantity come packed into one integer, and the
+    # times as the text they are stored as, which NumPy parses several
+    # times faster than SQLite's julianday().
+    return (
+        select([
+            table.c.asset_id * _PACK + table.c.quantity,
+            table.c.borrowed_at,
+            table.c.returned_at,
+        ])
+        .where(and_(
+            table.c.borrowed_at != None,
+            table.c.borrowed_at < bindparam('until'),
+            or_(
+                table.c.returned_at == None,
+                table.c.returned_at > bindparam('since')
+            )
+        ))
+    )
+
+GET_LOAN_INTERVALS = _select_loan_intervals(_loan)
+GET_ALL_LOAN_INTERVALS = union_all(
+    _select_loan_intervals(_loan_archive), GET_LOAN_INTERVALS)
+
+
+class LoanHistory:
+    '''
+    Loans of a time window held in NumPy arrays, for utilization analytics
+    that would take far too long over get_loans tuples.
+
+    Times are int64 milliseconds since the epoch, in the local time the
+    loan table stores. Each loan is an interval [start, end) clipped to the
+    window; loans not returned yet end at the end of the window.
+
+    Attributes:
+        names (list of str): asset names, sorted.
+        totals (ndarray): current total of each asset in names.
+        since, until (int): the window. since is the earliest start when
+            load wasn't given one.
+        asset (ndarray): index into names of each loan.
+        quantity, start, end (ndarray): of each loan.
+        length (ndarray): unclipped length of each loan, -1 if not returned.
+    '''
+
+    def __init__(self, names, totals, since, until,
+            asset, quantity, start, end, length):
+        self.names = names
+        self.totals = totals
+        self.since = since
+        self.until = until
+        self.asset = asset
+        self.quantity = quantity
+        self.start = start
+        self.end = end
+        self.length = length
+        self._sweep = None
+
+    @classmethod
+    def load(cls, database, since=None, until=None,
+            chunk_size=LOAN_CHUNK_SIZE, include_archived=False):
+        '''Stream the loans overlapping a window into arrays.
+
+        Arguments:
+            database (Database): the database to read.
+            since (date or datetime): start of the window.
+                None for the first loan.
+            until (date or datetime): end of the window, exclusive.
+                None for now.
+            chunk_size (int): the number of rows to fetch at a time.
+            include_archived (bool):
+                True if want loans moved by Model.archive_loans as well.
+
+        Returns:
+            LoanHistory: the loans.
+        '''
+
+        until = datetime.now() if until is None else as_datetime(until)
+        with database.engine.connect() as connection:
+            assets = connection.execute(GET_ASSET_TOTALS).fetchall()
+            result = connection.execute(
+                GET_ALL_LOAN_INTERVALS if include_archived
+                    else GET_LOAN_INTERVALS,
+                since=datetime.min if since is None else as_datetime(since),
+                until=until
+            )
+            asset_id, quantity, start, returned_at = \
+                _fetch_intervals(result, chunk_size)
+
+        asset = _get_index(
+            np.array([row[0] for row in assets], dtype=np.int64), asset_id)
+
+        until = _to_ms(until)
+        if since is not None:
+            since = _to_ms(since)
+        elif len(start):
+            since = int(start.min())
+        else:
+            since = until
+        returned = returned_at >= 0
+        end = np.where(returned, np.minimum(returned_at, until), until)
+        length = np.where(returned, returned_at - start, -1)
+        return cls(
+            [row[1] for row in assets],
+            np.array([row[2] for row in assets], dtype=np.int64),
+            since,
+            until,
+            asset,
+            quantity,
+            np.maximum(start, since),
+            end,
+            length
+        )
+
+    def _get_sweep(self):
+        # Events sorted by asset, then time, returns before borrows at the
+        # same time. Each asset's deltas sum to 0, so one cumulative sum
+        # over all events restarts from 0 at every asset.
+        if self._sweep is None:
+            assets = np.concatenate([self.asset, self.asset])
+            times = np.concatenate([self.start, self.end])
+            deltas = np.concatenate([self.quantity, -self.quantity])
+            # One int64 key sorts several times faster than lexsort, when
+            # the asset, time and direction of every event fit in it.
+            first = int(times.min()) if len(times) else 0
+            span = int(times.max()) - first + 1 if len(times) else 1
+            if len(self.names) * span * 2 < 2 ** 63:
+                order = np.argsort(
+                    (assets * span + (times - first)) * 2 + (deltas > 0))
+            else:
+                order = np.lexsort((deltas, times, assets))
+            assets = assets[order]
+            self._sweep = (
+                assets,
+                times[order],
+                np.cumsum(deltas[order]),
+                np.searchsorted(assets, np.arange(len(self.names) + 1))
+            )
+        return self._sweep
+
+    def occupancy(self, name):
+        '''Get the occupancy curve of an asset.
+
+        Arguments:
+            name (str): the asset.
+
+        Returns:
+            tuple: (times, units)
+                times (ndarray of datetime64[ms]): when the units out changed.
+                units (ndarray): units out on loan from each time on.
+
+        Raises:
+            KeyError: if the asset doesn't exist.
+        '''
+
+        index = np.searchsorted(self.names, name)
+        if index == len(self.names) or self.names[index] != name:
+            raise KeyError(name)
+        assets, times, units, bounds = self._get_sweep()
+        times = times[bounds[index]:bounds[index + 1]]
+        units = units[bounds[index]:bounds[index + 1]]
+        # keep the last of events at the same time
+        last = np.ones(len(times), dtype=bool)
+        last[:-1] = times[1:] != times[:-1]
+        return times[last].astype('datetime64[ms]'), units[last]
+
+    def utilization(self):
+        '''Get the utilization of every asset over the window.
+
+        Returns:
+            list of Utilization: sorted by name.
+        '''
+
+        count = len(self.names)
+        assets, times, units, bounds = self._get_sweep()
+        peak = np.zeros(count, dtype=np.int64)
+        used = np.flatnonzero(bounds[1:] > bounds[:-1])
+        if len(used):
+            peak[used] = np.maximum.reduceat(units, bounds[used])
+        busy = np.bincount(
+            self.asset,
+            weights=self.quantity * (self.end - self.start),
+            minlength=count
+        )
+        returned = self.length >= 0
+        returns = np.bincount(self.asset[returned], minlength=count)
+        length = np.bincount(
+            self.asset[returned],
+            weights=self.length[returned],
+            minlength=count
+        )
+        window = self.until - self.since
+        utilization = []
+        for i, name in enumerate(self.names):
+            total = int(self.totals[i])
+            utilization.append(Utilization(
+                name,
+                total,
+                float(busy[i] / (total * window)) if total and window
+                    else None,
+                int(peak[i]),
+                timedelta(milliseconds=length[i] / returns[i])
+                    if returns[i] else None
+            ))
+        return utilization
+
+
+def get_availability_calendar(database, days=FORECAST_DAYS):
+    '''
+    Project the instock of every asset for each day from today, like
+    Model.get_availability_forecast for all assets at once: one aggregate
+    query of the quantities due back, then a cumulative sum over days.
+
+    Arguments:
+        database (Database): the database to read.
+        days (int): the number of days to project.
+
+    Returns:
+        AvailabilityCalendar: the projection.
+    '''
+
+    today = date.today()
+    with database.engine.connect() as connection:
+        assets = connection.execute(GET_ASSET_INSTOCK).fetchall()
+        due = _fetch_array(connection.execute(
+            GET_DUE,
+            first=today,
+            last=today + timedelta(days=days - 1)
+        ), 3)
+
+    count = len(assets)
+    asset = _get_index(
+        np.array([row[0] for row in assets], dtype=np.int64), due[:, 0])
+    returned = np.bincount(
+        asset * days + due[:, 1],
+        weights=due[:, 2],
+        minlength=count * days
+    ).astype(np.int64).reshape(count, days)
+    instock = np.array([row[2] for row in assets], dtype=np.int64)
+    return AvailabilityCalendar(
+        [row[1] for row in assets],
+        [today + timedelta(days=i) for i in range(days)],
+        instock[:, np.newaxis] + np.cumsum(returned, axis=1)
+    )
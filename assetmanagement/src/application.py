@@ -1,9 +1,13 @@
 import sys
+import traceback
 
 from PyQt5 import QtGui, QtWidgets
 
 from main_controller import MainController
 from model import Model
+from observable import (NotificationDispatcher, coalesce_notifications,
+                        dispatch_notifications)
+from utils import QueuedExecutor
 
 class Application:
     def __init__(self):
@@ -13,8 +17,21 @@ class Application:
         self.app.setFont(font)
         self.app.setApplicationName("Equipment Management System")
         self.model = Model()
+        # Refresh the views once per event loop turn, however many model
+        # calls a slot makes. Both run on the GUI thread's event loop, even
+        # for model calls made on other threads, one observer at a time so
+        # an observer that raises can't take the others or the app down.
+        executor = QueuedExecutor()
+        coalesce_notifications(self.model, executor.submit)
+        dispatch_notifications(self.model, NotificationDispatcher(
+            executor, on_error=self.print_observer_error))
         self.controller = MainController(self.model)
 
+    @staticmethod
+    def print_observer_error(observer, exception):
+        traceback.print_exception(
+            type(exception), exception, exception.__traceback__)
+
     def run(self):
         self.controller.run()
         sys.exit(self.app.exec_())
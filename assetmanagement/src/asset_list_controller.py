@@ -14,20 +14,44 @@ class AssetListController:
             .connect(self.dialog.reject)
 
         self.model.add_asset.add_observer(
-            self.update_table,
-            pass_arguments=False
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
         )
         self.model.remove_asset.add_observer(
-            self.update_table,
-            pass_arguments=False
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
         )
         self.model.borrow_asset.add_observer(
-            self.update_table,
-            pass_arguments=False
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
         )
         self.model.return_asset.add_observer(
-            self.update_table,
-            pass_arguments=False
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
+        )
+        self.model.borrow_assets.add_observer(
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
+        )
+        self.model.return_assets.add_observer(
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
+        )
+        self.model.import_assets.add_observer(
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
+        )
+        self.model.import_loans.add_observer(
+            self.update_assets,
+            pass_arguments=False,
+            pass_changes=True
         )
 
     def run(self):
@@ -45,3 +69,18 @@ class AssetListController:
             instock_only=instock_only
         )
         self.view.update_table(assets)
+
+    def update_assets(self, changes):
+        # patch only the rows of the assets that changed
+        changes = [change for change in changes if change.entity == 'asset']
+        if any(change.key is None for change in changes):
+            self.update_table()
+            return
+        instock_only = self.view.get_instock_only()
+        for change in changes:
+            # the same filters update_table asks get_assets for
+            if change.new is None or change.new[0] <= 0 \
+                    or (instock_only and change.new[1] <= 0):
+                self.view.remove_asset(change.key)
+            else:
+                self.view.put_asset((change.key,) + change.new)
@@ -18,6 +18,39 @@ class AssetListView(Ui_AssetListDialog):
         table.setRowCount(0)
         for row, asset in enumerate(assets):
             table.insertRow(row)
-            table.setItem(row, 0, QtWidgets.QTableWidgetItem(asset[0]))
-            table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(asset[1])))
-            table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(asset[2])))
+            self._set_row(row, asset)
+
+    def put_asset(self, asset):
+        '''Update the row of asset, inserting it in name order if missing.'''
+
+        table = self.tableWidget
+        row = self._find_row(asset[0])
+        if row == table.rowCount() or table.item(row, 0).text() != asset[0]:
+            table.insertRow(row)
+        self._set_row(row, asset)
+
+    def remove_asset(self, name):
+        '''Remove the row of asset with name, if there is one.'''
+
+        table = self.tableWidget
+        row = self._find_row(name)
+        if row < table.rowCount() and table.item(row, 0).text() == name:
+            table.removeRow(row)
+
+    def _find_row(self, name):
+        # rows are sorted by name: the row of name, or where it belongs
+        table = self.tableWidget
+        low, high = 0, table.rowCount()
+        while low < high:
+            middle = (low + high) // 2
+            if table.item(middle, 0).text() < name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _set_row(self, row, asset):
+        table = self.tableWidget
+        table.setItem(row, 0, QtWidgets.QTableWidgetItem(asset[0]))
+        table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(asset[1])))
+        table.setItem(row, 2, QtWidgets.QTableWidgetItem(str(asset[2])))
@@ -4,7 +4,7 @@ from PyQt5 import QtWidgets
 from sqlalchemy.exc import IntegrityError
 
 from borrow_view import BorrowView
-from utils import error_message
+from utils import enable_search, error_message
 
 class BorrowController:
     def __init__(self, model):
@@ -12,8 +12,24 @@ class BorrowController:
         self.view = BorrowView(self.dialog)
         self.model = model
 
+        enable_search(
+            self.view.comboBox_Borrower,
+            lambda text: self.model.search_borrowers(text, active_only=True)
+        )
+        enable_search(
+            self.view.comboBox_Asset,
+            lambda text: self.model.search_assets(text, instock_only=True)
+        )
+
+        # (asset_name, quantity) of each asset added to cart
+        self.cart = []
+
         self.view.comboBox_Asset.currentIndexChanged \
             .connect(self.update_spinbox_range)
+        self.view.pushButton_AddToCart.clicked \
+            .connect(self.add_to_cart)
+        self.view.pushButton_RemoveFromCart.clicked \
+            .connect(self.remove_from_cart)
         self.view.buttonBox.accepted \
             .connect(self.borrow_asset)
         self.view.buttonBox.rejected \
@@ -27,6 +43,10 @@ class BorrowController:
             self.update_borrower_combobox,
             pass_arguments=False
         )
+        self.model.import_borrowers.add_observer(
+            self.update_borrower_combobox,
+            pass_arguments=False
+        )
         self.model.add_asset.add_observer(
             self.update_asset_combobox,
             pass_arguments=False
@@ -43,12 +63,30 @@ class BorrowController:
             self.update_asset_combobox,
             pass_arguments=False
         )
+        self.model.borrow_assets.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
+        self.model.return_assets.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
+        self.model.import_assets.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
+        self.model.import_loans.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
 
     def run(self):
         self.reset()
         self.dialog.show()
 
     def reset(self):
+        self.cart = []
+        self.view.update_cart_list(self.cart)
         self.update_borrower_combobox()
         self.update_asset_combobox()
         self.update_spinbox_range()
@@ -57,13 +95,12 @@ class BorrowController:
         self.view.clear_quantity_spinbox()
 
     def update_borrower_combobox(self):
-        borrower_names = self.model.get_borrower_names(active_only=True)
+        borrower_names = self.model.search_borrowers('', active_only=True)
         self.view.update_borrower_combobox(borrower_names)
         self.view.deselect_borrower_combobox()
 
     def update_asset_combobox(self):
-        assets = self.model.get_assets(instock_only=True)
-        asset_names = [asset[0] for asset in assets]
+        asset_names = self.model.search_assets('', instock_only=True)
         self.view.update_asset_combobox(asset_names)
         self.view.deselect_asset_combobox()
 
@@ -71,10 +108,47 @@ class BorrowController:
         _, asset_name, _ = self.view.get_borrow_arguments()
         if asset_name is None:
             self.view.set_quantity_spinbox_range(0, 0)
+            self.view.update_availability_label(0, None)
         else:
             asset = self.model.get_asset(asset_name)
             # asset[1] is total, asset[2] is instock
-            self.view.set_quantity_spinbox_range(1, asset[2])
+            self.view.update_availability_label(
+                asset[2], self.model.get_availability_forecast(asset_name))
+            available = asset[2] - self.get_cart_quantity(asset_name)
+            if available > 0:
+                self.view.set_quantity_spinbox_range(1, available)
+            else:
+                self.view.set_quantity_spinbox_range(0, 0)
+
+    def get_cart_quantity(self, asset_name):
+        return sum(
+            quantity for name, quantity in self.cart if name == asset_name)
+
+    def add_to_cart(self):
+        _, asset_name, quantity = self.view.get_borrow_arguments()
+        if asset_name is None:
+            error_message(
+                self.dialog,
+                'Please select an asset.'
+            )
+            return
+        # spinbox range is (0, 0) when all instock is already in cart
+        if quantity <= 0:
+            error_message(
+                self.dialog,
+                'No more <{}> in stock.'.format(asset_name)
+            )
+            return
+        self.cart.append((asset_name, quantity))
+        self.view.update_cart_list(self.cart)
+        self.view.deselect_asset_combobox()
+        self.view.clear_quantity_spinbox()
+
+    def remove_from_cart(self):
+        for row in reversed(self.view.get_selected_cart_rows()):
+            del self.cart[row]
+        self.view.update_cart_list(self.cart)
+        self.update_spinbox_range()
 
     def borrow_asset(self):
         borrower_name, asset_name, quantity = self.view.get_borrow_arguments()
@@ -86,6 +160,9 @@ class BorrowController:
                 'Please select a borrower.'
             )
             return
+        if self.cart:
+            self.borrow_cart(borrower_name, asset_name, quantity, datedue)
+            return
         if asset_name is None:
             error_message(
                 self.dialog,
@@ -100,3 +177,23 @@ class BorrowController:
             datedue=datedue
         )
         self.dialog.accept()
+
+    def borrow_cart(self, borrower_name, asset_name, quantity, datedue):
+        items = list(self.cart)
+        # an asset still selected is borrowed along with the cart
+        if asset_name is not None and quantity > 0:
+            items.append((asset_name, quantity))
+        try:
+            self.model.borrow_assets(
+                borrower_name=borrower_name,
+                items=items,
+                datedue=datedue
+            )
+        except IntegrityError:
+            # Instock might have changed since the items were added to cart.
+            error_message(
+                self.dialog,
+                'Not enough equipment in stock for the cart.'
+            )
+            return
+        self.dialog.accept()
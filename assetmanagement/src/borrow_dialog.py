@@ -13,7 +13,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_BorrowDialog(object):
     def setupUi(self, BorrowDialog):
         BorrowDialog.setObjectName("BorrowDialog")
-        BorrowDialog.resize(298, 299)
+        BorrowDialog.resize(298, 420)
         self.gridLayout = QtWidgets.QGridLayout(BorrowDialog)
         self.gridLayout.setObjectName("gridLayout")
         self.verticalLayout = QtWidgets.QVBoxLayout()
@@ -47,7 +47,29 @@ class Ui_BorrowDialog(object):
         self.spinBox_Quantity = QtWidgets.QSpinBox(BorrowDialog)
         self.spinBox_Quantity.setObjectName("spinBox_Quantity")
         self.formLayout.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.spinBox_Quantity)
+        self.horizontalLayout_Cart = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_Cart.setObjectName("horizontalLayout_Cart")
+        self.pushButton_AddToCart = QtWidgets.QPushButton(BorrowDialog)
+        self.pushButton_AddToCart.setAutoDefault(False)
+        self.pushButton_AddToCart.setObjectName("pushButton_AddToCart")
+        self.horizontalLayout_Cart.addWidget(self.pushButton_AddToCart)
+        self.pushButton_RemoveFromCart = QtWidgets.QPushButton(BorrowDialog)
+        self.pushButton_RemoveFromCart.setAutoDefault(False)
+        self.pushButton_RemoveFromCart.setObjectName("pushButton_RemoveFromCart")
+        self.horizontalLayout_Cart.addWidget(self.pushButton_RemoveFromCart)
+        self.formLayout.setLayout(3, QtWidgets.QFormLayout.FieldRole, self.horizontalLayout_Cart)
+        self.label_Cart = QtWidgets.QLabel(BorrowDialog)
+        self.label_Cart.setObjectName("label_Cart")
+        self.formLayout.setWidget(4, QtWidgets.QFormLayout.LabelRole, self.label_Cart)
+        self.listWidget_Cart = QtWidgets.QListWidget(BorrowDialog)
+        self.listWidget_Cart.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
+        self.listWidget_Cart.setObjectName("listWidget_Cart")
+        self.formLayout.setWidget(4, QtWidgets.QFormLayout.FieldRole, self.listWidget_Cart)
         self.verticalLayout.addLayout(self.formLayout)
+        self.label_Availability = QtWidgets.QLabel(BorrowDialog)
+        self.label_Availability.setWordWrap(True)
+        self.label_Availability.setObjectName("label_Availability")
+        self.verticalLayout.addWidget(self.label_Availability)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout.addItem(spacerItem)
         self.buttonBox = QtWidgets.QDialogButtonBox(BorrowDialog)
@@ -67,3 +89,6 @@ class Ui_BorrowDialog(object):
         self.label_Borrower.setText(_translate("BorrowDialog", "Borrower: "))
         self.label_Asset.setText(_translate("BorrowDialog", "Equipment: "))
         self.label_Quantity.setText(_translate("BorrowDialog", "Quantity: "))
+        self.pushButton_AddToCart.setText(_translate("BorrowDialog", "Add to Cart"))
+        self.pushButton_RemoveFromCart.setText(_translate("BorrowDialog", "Remove"))
+        self.label_Cart.setText(_translate("BorrowDialog", "Cart: "))
@@ -1,12 +1,23 @@
 from PyQt5 import QtWidgets
 
 from borrow_list_view import BorrowListView
+from utils import enable_search
 
 class BorrowListController:
     def __init__(self, model):
         self.dialog = QtWidgets.QDialog()
         self.view = BorrowListView(self.dialog)
         self.model = model
+        self.cursor = None
+
+        enable_search(
+            self.view.comboBox_Borrower,
+            lambda text: self.model.search_borrowers(text, active_only=True)
+        )
+        enable_search(
+            self.view.comboBox_Asset,
+            lambda text: self.model.search_assets(text, active_only=True)
+        )
 
         self.view.comboBox_Borrower.currentIndexChanged \
             .connect(self.update_table)
@@ -22,6 +33,8 @@ class BorrowListController:
             .connect(self.update_table)
         self.view.radioButton_Overdue.toggled \
             .connect(self.update_table)
+        self.view.tableWidget.verticalScrollBar().valueChanged \
+            .connect(self.fetch_more)
         self.view.buttonBox.rejected \
             .connect(self.dialog.reject)
 
@@ -33,6 +46,10 @@ class BorrowListController:
             self.update_borrower_combobox,
             pass_arguments=False
         )
+        self.model.import_borrowers.add_observer(
+            self.update_borrower_combobox,
+            pass_arguments=False
+        )
         self.model.add_asset.add_observer(
             self.update_asset_combobox,
             pass_arguments=False
@@ -41,6 +58,10 @@ class BorrowListController:
             self.update_asset_combobox,
             pass_arguments=False
         )
+        self.model.import_assets.add_observer(
+            self.update_asset_combobox,
+            pass_arguments=False
+        )
         self.model.borrow_asset.add_observer(
             self.update_table,
             pass_arguments=False
@@ -49,6 +70,18 @@ class BorrowListController:
             self.update_table,
             pass_arguments=False
         )
+        self.model.borrow_assets.add_observer(
+            self.update_table,
+            pass_arguments=False
+        )
+        self.model.return_assets.add_observer(
+            self.update_table,
+            pass_arguments=False
+        )
+        self.model.import_loans.add_observer(
+            self.update_table,
+            pass_arguments=False
+        )
 
     def run(self):
         self.reset()
@@ -63,23 +96,39 @@ class BorrowListController:
         self.update_table()
 
     def update_borrower_combobox(self):
-        borrower_names = self.model.get_borrower_names(active_only=True)
+        borrower_names = self.model.search_borrowers('', active_only=True)
         self.view.update_borrower_combobox(borrower_names)
         self.view.deselect_borrower_combobox()
 
     def update_asset_combobox(self):
-        assets = self.model.get_assets(active_only=True)
-        asset_names = [asset[0] for asset in assets]
+        asset_names = self.model.search_assets('', active_only=True)
         self.view.update_asset_combobox(asset_names)
         self.view.deselect_asset_combobox()
 
     def update_table(self):
+        # Counting every matching loan costs more than the page itself, so
+        # the total is only known once the last page is in.
+        self.cursor = None
+        page = self.get_loans_page()
+        self.view.update_table(page.loans)
+        self.view.update_count_label(self.cursor is not None)
+
+    def fetch_more(self):
+        if self.cursor is None or not self.view.is_table_scrolled_to_end():
+            return
+        page = self.get_loans_page()
+        self.view.append_table(page.loans)
+        self.view.update_count_label(self.cursor is not None)
+
+    def get_loans_page(self):
         borrower_name, asset_name, active_only, overdue_only =\
             self.view.get_update_table_arguments()
-        loans = self.model.get_loans(
+        page = self.model.get_loans_page(
             borrower_name=borrower_name,
             asset_name=asset_name,
             active_only=active_only,
-            overdue_only=overdue_only
+            overdue_only=overdue_only,
+            after=self.cursor
         )
-        self.view.update_table(loans)
+        self.cursor = page.cursor
+        return page
@@ -104,6 +104,9 @@ class Ui_BorrowListDialog(object):
         header.setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeToContents)
         header.setSectionResizeMode(4, QtWidgets.QHeaderView.ResizeToContents)
         self.verticalLayout.addWidget(self.tableWidget)
+        self.label_Count = QtWidgets.QLabel(BorrowListDialog)
+        self.label_Count.setObjectName("label_Count")
+        self.verticalLayout.addWidget(self.label_Count)
         self.buttonBox = QtWidgets.QDialogButtonBox(BorrowListDialog)
         self.pushButton_Close = QtWidgets.QPushButton()
         self.pushButton_Close.setAutoDefault(False)
@@ -41,8 +41,13 @@ class BorrowListView(Ui_BorrowListDialog):
         table = self.tableWidget
         table.clearContents()
         table.setRowCount(0)
-        for row, loan in enumerate(loans):
-            table.insertRow(row)
+        self.append_table(loans)
+
+    def append_table(self, loans):
+        table = self.tableWidget
+        start = table.rowCount()
+        table.setRowCount(start + len(loans))
+        for row, loan in enumerate(loans, start):
             table.setItem(row, 0, \
                 QtWidgets.QTableWidgetItem(loan[0]))
             table.setItem(row, 1, \
@@ -53,3 +58,12 @@ class BorrowListView(Ui_BorrowListDialog):
                 QtWidgets.QTableWidgetItem(loan[3].strftime("%Y-%m-%d")))
             table.setItem(row, 4, \
                 QtWidgets.QTableWidgetItem('Yes' if loan[4] else 'No'))
+
+    def update_count_label(self, more):
+        count = self.tableWidget.rowCount()
+        self.label_Count.setText('Showing {} of {}{} loans'.format(
+            count, count, '+' if more else ''))
+
+    def is_table_scrolled_to_end(self):
+        scroll_bar = self.tableWidget.verticalScrollBar()
+        return scroll_bar.value() >= scroll_bar.maximum()
@@ -36,3 +36,38 @@ class BorrowView(Ui_BorrowDialog):
     def set_quantity_spinbox_range(self, minimum, maximum):
         self.spinBox_Quantity.setMinimum(minimum)
         self.spinBox_Quantity.setMaximum(maximum)
+
+    def update_availability_label(self, instock, forecast):
+        '''Show the units due back on each day of forecast.
+
+        Arguments:
+            instock (int): the instock now.
+            forecast (list of tuple): (date, instock) of each day as
+                Model.get_availability_forecast, or None to clear the label.
+        '''
+
+        if forecast is None:
+            self.label_Availability.clear()
+            return
+        returns = []
+        for day, projected in forecast:
+            if projected > instock:
+                returns.append('{} on {}'.format(projected - instock, day))
+            instock = projected
+        if returns:
+            self.label_Availability.setText(
+                'Due back: {}'.format(', '.join(returns)))
+        else:
+            self.label_Availability.setText(
+                'Nothing due back in {} days.'.format(len(forecast)))
+
+    def update_cart_list(self, items):
+        self.listWidget_Cart.clear()
+        self.listWidget_Cart.addItems(
+            '{} ({})'.format(asset_name, quantity)
+            for asset_name, quantity in items)
+
+    def get_selected_cart_rows(self):
+        return sorted(
+            self.listWidget_Cart.row(item)
+            for item in self.listWidget_Cart.selectedItems())
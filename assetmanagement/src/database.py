@@ -1,11 +1,15 @@
 from contextlib import contextmanager
+from datetime import datetime
 
-from sqlalchemy import (Boolean, CheckConstraint, Column, Date, ForeignKey,
-                        Integer, String, create_engine)
+from sqlalchemy import (Boolean, CheckConstraint, Column, Date, DateTime,
+                        ForeignKey, Index, Integer, MetaData, String, Table,
+                        create_engine, event, func, inspect, select, text)
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-from definitions import ENGINE
+from definitions import ENGINE, PROFILE
 
 Base = declarative_base()
 
@@ -74,6 +78,14 @@ class Asset(Base):
 
 class Loan(Base):
     __tablename__ = 'loan'
+    __table_args__ = (
+        Index('ix_loan_borrower_asset_returned',
+            'borrower_id', 'asset_id', 'is_returned'),
+        Index('ix_loan_returned_datedue', 'is_returned', 'datedue'),
+        Index('ix_loan_borrowed_at', 'borrowed_at'),
+        Index('ix_loan_asset_returned_datedue',
+            'asset_id', 'is_returned', 'datedue'),
+    )
 
     id = Column(Integer, primary_key=True)
     borrower_id = Column(Integer, ForeignKey("borrower.id"), nullable=False)
@@ -81,6 +93,10 @@ class Loan(Base):
     quantity = Column(Integer, nullable=False)
     datedue = Column(Date, nullable=False)
     is_returned = Column(Boolean, nullable=False, default=False)
+    # Local time. NULL when unknown, as for loans from before these columns
+    # existed or imported without them.
+    borrowed_at = Column(DateTime, default=datetime.now)
+    returned_at = Column(DateTime)
 
     borrower = relationship('Borrower', back_populates='loans')
     asset = relationship('Asset', back_populates='loans')
@@ -91,12 +107,501 @@ class Loan(Base):
                 self.borrower_id, self.asset_id, self.quantity,
                 self.datedue, self.is_returned))
 
+class LoanArchive(Base):
+    '''
+    Returned loans moved out of loan by Model.archive_loans, so queries of
+    the loans in use don't wade through years of history. Rows keep their
+    loan id.
+    '''
+
+    __tablename__ = 'loan_archive'
+    __table_args__ = (
+        Index('ix_loan_archive_borrowed_at', 'borrowed_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    borrower_id = Column(Integer, ForeignKey("borrower.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("asset.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    datedue = Column(Date, nullable=False)
+    is_returned = Column(Boolean, nullable=False, default=True)
+    borrowed_at = Column(DateTime)
+    returned_at = Column(DateTime)
+
+    def __repr__(self):
+        return ('<LoanArchive(borrower_id: {}, asset_id: {}, quantity: {}, '
+            'datedue: {}, returned_at: {})>'.format(
+                self.borrower_id, self.asset_id, self.quantity,
+                self.datedue, self.returned_at))
+
+class Outstanding(Base):
+    '''
+    Quantity of each asset a borrower has not returned yet.
+    The sum of all active loans per (borrower, asset), kept up to date by
+    every write to loan. Rows are deleted rather than dropping to 0.
+    '''
+
+    __tablename__ = 'outstanding'
+    __table_args__ = (
+        Index('ix_outstanding_asset', 'asset_id'),
+    )
+
+    borrower_id = Column(Integer, ForeignKey("borrower.id"), primary_key=True)
+    asset_id = Column(Integer, ForeignKey("asset.id"), primary_key=True)
+    quantity = Column(
+        Integer,
+        CheckConstraint('quantity > 0', name='check_positive'),
+        nullable=False
+    )
+
+    def __repr__(self):
+        return '<Outstanding(borrower_id: {}, asset_id: {}, quantity: {})>' \
+            .format(self.borrower_id, self.asset_id, self.quantity)
+
+class Reservation(Base):
+    '''
+    Quantity of an asset a borrower has booked from datefrom to dateto,
+    both inclusive. Model.reserve keeps the reservations of each day plus
+    the loans out that day within the asset's total.
+    '''
+
+    __tablename__ = 'reservation'
+    __table_args__ = (
+        CheckConstraint('dateto >= datefrom', name='check_range'),
+        Index('ix_reservation_asset_dateto', 'asset_id', 'dateto'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    borrower_id = Column(Integer, ForeignKey("borrower.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("asset.id"), nullable=False)
+    quantity = Column(
+        Integer,
+        CheckConstraint('quantity > 0', name='check_positive'),
+        nullable=False
+    )
+    datefrom = Column(Date, nullable=False)
+    dateto = Column(Date, nullable=False)
+
+    borrower = relationship('Borrower')
+    asset = relationship('Asset')
+
+    def __repr__(self):
+        return ('<Reservation(borrower_id: {}, asset_id: {}, quantity: {}, '
+            'datefrom: {}, dateto: {})>'.format(
+                self.borrower_id, self.asset_id, self.quantity,
+                self.datefrom, self.dateto))
+
+# Adds :quantity to the outstanding row of (:borrower_id, :asset_id),
+# creating it if needed. Takes a list of parameter dicts for executemany.
+ADD_OUTSTANDING = text(
+    'INSERT INTO outstanding (borrower_id, asset_id, quantity) '
+    'VALUES (:borrower_id, :asset_id, :quantity) '
+    'ON CONFLICT (borrower_id, asset_id) '
+    'DO UPDATE SET quantity = quantity + excluded.quantity'
+)
+
+def rebuild_outstanding(connection):
+    '''Recompute the outstanding table from active loans.'''
+
+    table = Outstanding.__table__
+    connection.execute(table.delete())
+    connection.execute(table.insert().from_select(
+        ['borrower_id', 'asset_id', 'quantity'],
+        select([Loan.borrower_id, Loan.asset_id, func.sum(Loan.quantity)])
+        .where(Loan.is_returned == False)
+        .group_by(Loan.borrower_id, Loan.asset_id)
+    ))
+
+# Full-text indexes of borrower and asset names, for search as you type.
+# They are FTS5 external content tables: they hold only the index and read
+# names from the table itself. Triggers keep them in step with every insert,
+# update and delete, so writers don't need to know about them.
+# prefix='1 2 3' indexes short prefixes so the first keystrokes are fast.
+NAME_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {0}_fts USING fts5("
+    "name, content='{0}', content_rowid='id', prefix='1 2 3')",
+    "CREATE TRIGGER IF NOT EXISTS {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+    "INSERT INTO {0}_fts (rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+    "INSERT INTO {0}_fts ({0}_fts, rowid, name) "
+    "VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {0}_fts_update AFTER UPDATE OF name ON {0} "
+    "BEGIN "
+    "INSERT INTO {0}_fts ({0}_fts, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    "INSERT INTO {0}_fts (rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO {0}_fts ({0}_fts) VALUES ('rebuild')",
+]
+
+# For querying the full-text indexes, which create_all must not touch.
+NAME_SEARCH_TABLES = {
+    table.name: Table(
+        table.name + '_fts', MetaData(),
+        Column('rowid', Integer),
+        Column('name', String)
+    )
+    for table in (Borrower.__table__, Asset.__table__)
+}
+
+def has_fts5(connection):
+    options = connection.execute('PRAGMA compile_options')
+    return 'ENABLE_FTS5' in {option for (option,) in options}
+
+def create_name_search(connection, table):
+    '''
+    Create the full-text index of table names and fill it from the table.
+    Does nothing if SQLite is built without FTS5.
+    '''
+
+    if not has_fts5(connection):
+        return
+    for statement in NAME_SEARCH_DDL:
+        connection.execute(statement.format(table.name))
+
+# create_all builds fresh databases, so it has to build the indexes too.
+def on_create_name_search(table, connection, **kw):
+    create_name_search(connection, table)
+
+event.listen(Borrower.__table__, 'after_create', on_create_name_search)
+event.listen(Asset.__table__, 'after_create', on_create_name_search)
+
+def has_name_search(connection):
+    return connection.dialect.has_table(
+        connection, NAME_SEARCH_TABLES['borrower'].name)
+
+class AssetLedger(Base):
+    '''
+    Append-only history of asset total and instock as signed deltas.
+    Summing the deltas of an asset up to a time gives its state then.
+    Written only by the triggers in LEDGER_DDL, never by the model.
+    '''
+
+    __tablename__ = 'asset_ledger'
+    __table_args__ = (
+        Index('ix_asset_ledger_at', 'at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    asset_id = Column(Integer, ForeignKey("asset.id"), nullable=False)
+    # Local time, like Loan.borrowed_at.
+    at = Column(DateTime, nullable=False)
+    total_delta = Column(Integer, nullable=False)
+    instock_delta = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return ('<AssetLedger(asset_id: {}, at: {}, total_delta: {}, '
+            'instock_delta: {})>'.format(
+                self.asset_id, self.at, self.total_delta, self.instock_delta))
+
+class LedgerSnapshot(Base):
+    '''
+    Total and instock of every asset right after ledger entry ledger_id,
+    so rebuilding a past state only replays the entries after a snapshot.
+    '''
+
+    __tablename__ = 'ledger_snapshot'
+
+    ledger_id = Column(
+        Integer, ForeignKey("asset_ledger.id"), primary_key=True)
+    asset_id = Column(Integer, ForeignKey("asset.id"), primary_key=True)
+    total = Column(Integer, nullable=False)
+    instock = Column(Integer, nullable=False)
+
+# A snapshot is taken every this many ledger entries. Rebuilding a past
+# state replays at most this many entries, and each snapshot copies every
+# asset row.
+LEDGER_SNAPSHOT_INTERVAL = 1000
+
+# The format SQLAlchemy stores DateTime in, which wants six fraction digits
+# where SQLite's %f gives three.
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000'"
+
+# Every change to asset, whatever makes it, lands in the ledger. Row
+# triggers run as each row changes, so a snapshot taken from the ledger's
+# own trigger sees asset exactly as of that entry.
+LEDGER_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS asset_ledger_insert "
+    "AFTER INSERT ON asset BEGIN "
+    "INSERT INTO asset_ledger (asset_id, at, total_delta, instock_delta) "
+    "VALUES (new.id, {now}, new.total, new.instock); END",
+    "CREATE TRIGGER IF NOT EXISTS asset_ledger_update "
+    "AFTER UPDATE OF total, instock ON asset "
+    "WHEN new.total != old.total OR new.instock != old.instock BEGIN "
+    "INSERT INTO asset_ledger (asset_id, at, total_delta, instock_delta) "
+    "VALUES (new.id, {now}, new.total - old.total, "
+    "new.instock - old.instock); END",
+    "CREATE TRIGGER IF NOT EXISTS asset_ledger_snapshot "
+    "AFTER INSERT ON asset_ledger WHEN new.id % {interval} = 0 BEGIN "
+    "INSERT INTO ledger_snapshot (ledger_id, asset_id, total, instock) "
+    "SELECT new.id, id, total, instock FROM asset; END",
+    "CREATE TRIGGER IF NOT EXISTS asset_ledger_no_update "
+    "BEFORE UPDATE ON asset_ledger BEGIN "
+    "SELECT RAISE(ABORT, 'asset_ledger is append-only'); END",
+    "CREATE TRIGGER IF NOT EXISTS asset_ledger_no_delete "
+    "BEFORE DELETE ON asset_ledger BEGIN "
+    "SELECT RAISE(ABORT, 'asset_ledger is append-only'); END",
+]
+
+def create_ledger_triggers(connection):
+    for statement in LEDGER_DDL:
+        connection.execute(statement.format(
+            now=SQLITE_NOW, interval=LEDGER_SNAPSHOT_INTERVAL))
+
+# The triggers need both asset and asset_ledger, so wait for create_all to
+# finish every table.
+def on_create_ledger(metadata, connection, **kw):
+    create_ledger_triggers(connection)
+
+event.listen(Base.metadata, 'after_create', on_create_ledger)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+def create_missing_indexes(connection, table, names):
+    existing = {index['name'] for index in inspect(connection).get_indexes(
+        table.name)}
+    for index in table.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(connection)
+
+def migrate_loan_indexes(connection):
+    create_missing_indexes(connection, Loan.__table__, {
+        'ix_loan_borrower_asset_returned',
+        'ix_loan_returned_datedue',
+    })
+
+def migrate_outstanding(connection):
+    Outstanding.__table__.create(connection, checkfirst=True)
+    rebuild_outstanding(connection)
+
+def migrate_name_search(connection):
+    create_name_search(connection, Borrower.__table__)
+    create_name_search(connection, Asset.__table__)
+
+def migrate_loan_timestamps(connection):
+    # SQLite can add nullable columns in place. Existing loans keep NULL,
+    # since when they were borrowed or returned was never recorded.
+    columns = {column['name'] for column in inspect(connection).get_columns(
+        Loan.__tablename__)}
+    for name in ('borrowed_at', 'returned_at'):
+        if name not in columns:
+            connection.execute(
+                'ALTER TABLE loan ADD COLUMN {} DATETIME'.format(name))
+    create_missing_indexes(connection, Loan.__table__, {
+        'ix_loan_borrowed_at',
+    })
+
+def migrate_asset_ledger(connection):
+    AssetLedger.__table__.create(connection, checkfirst=True)
+    LedgerSnapshot.__table__.create(connection, checkfirst=True)
+    create_ledger_triggers(connection)
+    # open the ledger with the current state, as history before it is lost
+    connection.execute(
+        'INSERT INTO asset_ledger (asset_id, at, total_delta, instock_delta) '
+        'SELECT id, {}, total, instock FROM asset'.format(SQLITE_NOW))
+
+def migrate_loan_asset_due(connection):
+    create_missing_indexes(connection, Loan.__table__, {
+        'ix_loan_asset_returned_datedue',
+    })
+
+def migrate_reservations(connection):
+    Reservation.__table__.create(connection, checkfirst=True)
+
+def migrate_loan_archive(connection):
+    LoanArchive.__table__.create(connection, checkfirst=True)
+
+# MIGRATIONS[i] upgrades a database from schema version i to i + 1.
+# Databases created before versioning existed are version 0.
+# Fresh databases are built by create_all and stamped with SCHEMA_VERSION,
+# so the models above must always describe the latest schema.
+MIGRATIONS = [
+    migrate_loan_indexes,
+    migrate_outstanding,
+    migrate_name_search,
+    migrate_loan_timestamps,
+    migrate_asset_ledger,
+    migrate_loan_asset_due,
+    migrate_reservations,
+    migrate_loan_archive,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(connection):
+    '''Get the stored schema version.
+
+    Returns:
+        int: the version, 0 for a database predating versioning.
+        None: if the database is empty.
+    '''
+
+    dialect = connection.dialect
+    if dialect.has_table(connection, SchemaVersion.__tablename__):
+        return connection.execute(select([SchemaVersion.version])).scalar()
+    if dialect.has_table(connection, Borrower.__tablename__):
+        return 0
+    return None
+
+def set_schema_version(connection, version):
+    table = SchemaVersion.__table__
+    result = connection.execute(table.update().values(version=version))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(version=version))
+
+def upgrade_schema(connection):
+    '''Bring the database up to SCHEMA_VERSION.
+
+    Raises:
+        RuntimeError: if the database was written by a newer schema.
+    '''
+
+    version = get_schema_version(connection)
+    if version == SCHEMA_VERSION:
+        return
+    if version is None:
+        Base.metadata.create_all(connection)
+        set_schema_version(connection, SCHEMA_VERSION)
+        return
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            'Database schema version {} is newer than {}'.format(
+                version, SCHEMA_VERSION))
+    SchemaVersion.__table__.create(connection, checkfirst=True)
+    for i in range(version, SCHEMA_VERSION):
+        MIGRATIONS[i](connection)
+        # stamp each step so an interrupted upgrade resumes where it stopped
+        set_schema_version(connection, i + 1)
+
+# Pragmas run on every new SQLite connection, by profile name.
+# 'durable' keeps SQLite's rollback journal and full fsync on every commit.
+# 'fast' switches to WAL, which only needs to fsync at checkpoints, and gives
+# each connection a bigger page cache and a memory-mapped read path.
+# 'memory' gives up durability entirely and is meant for tests and scratch
+# databases.
+PROFILES = {
+    'durable': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    'memory': {
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'cache_size': -16000,
+        'temp_store': 'MEMORY',
+    },
+}
+
+def get_pragmas(profile):
+    '''Resolve a profile into the pragmas to run on each connection.
+
+    Arguments:
+        profile (str or dict or None):
+            a key of PROFILES, a dict of pragma name to value,
+            or None to leave SQLite defaults alone.
+
+    Returns:
+        dict: pragma name to value.
+
+    Raises:
+        ValueError: if profile is unknown or a pragma is malformed.
+    '''
+
+    if profile is None:
+        return {}
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError('Unknown database profile: {}'.format(profile))
+        return PROFILES[profile]
+    for name, value in profile.items():
+        # pragmas can't take bound parameters, so only accept plain tokens
+        if not name.isidentifier() or not str(value).lstrip('-').isalnum():
+            raise ValueError('Malformed pragma: {}={}'.format(name, value))
+    return profile
+
+def is_memory_url(engine):
+    database = make_url(engine).database
+    return database in (None, '', ':memory:')
+
 class Database:
-    def __init__(self, engine=ENGINE):
-        self.engine = create_engine(engine)
-        Base.metadata.create_all(self.engine)
+    def __init__(self, engine=ENGINE, profile=PROFILE):
+        pragmas = get_pragmas(profile)
+        if is_memory_url(engine):
+            self.engine = create_engine(engine)
+        else:
+            # Keep connections open between sessions instead of reconnecting
+            # for every one, so the page cache and pragmas survive. LIFO keeps
+            # reusing the same warm connection when only one thread is busy.
+            self.engine = create_engine(
+                engine,
+                poolclass=QueuePool,
+                pool_use_lifo=True,
+                connect_args={'check_same_thread': False}
+            )
+        self.pragmas = pragmas
+        self.generation = 0
+        event.listen(self.engine, 'connect', self._on_connect)
+        with self.engine.begin() as connection:
+            upgrade_schema(connection)
+            self.name_search = has_name_search(connection)
         self.Session = sessionmaker(bind=self.engine)
 
+    def _on_connect(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+    def get_generation(self, session=None):
+        '''
+        Get a number that changes when the database may have been changed
+        by another connection, such as another process sharing the file.
+
+        Each connection remembers the last PRAGMA data_version it read,
+        which SQLite bumps when any other connection commits. A connection
+        seen for the first time also counts as a change, so caches filled
+        through one connection are never trusted through another.
+
+        Arguments:
+            session (Session):
+                the session whose connection to check.
+                None to check a pooled connection without a session,
+                which is much cheaper when there is nothing else to do.
+
+        Returns:
+            int: the generation.
+        '''
+
+        if session is not None:
+            return self._check_data_version(session.connection().connection)
+        connection = self.engine.raw_connection()
+        try:
+            return self._check_data_version(connection)
+        finally:
+            connection.close()
+
+    def _check_data_version(self, connection):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA data_version')
+        (data_version,) = cursor.fetchone()
+        cursor.close()
+        info = connection.info
+        if info.get('data_version') != data_version:
+            info['data_version'] = data_version
+            self.generation += 1
+        return self.generation
+
     @contextmanager
     def get_session(self):
         session = self.Session()
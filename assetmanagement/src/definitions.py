@@ -12,3 +12,6 @@ if os.name == 'nt':
     ENGINE = 'sqlite:///' + application_path + '/equipmentmanagement.db'
 else:
     ENGINE = 'sqlite:////' + application_path + '/equipmentmanagement.db'
+
+# Connection pragmas for the database, see database.PROFILES.
+PROFILE = 'fast'
@@ -0,0 +1,122 @@
+import threading
+from bisect import insort
+
+
+class Inventory:
+    '''
+    Snapshot of the total and instock of every asset, so reads of the asset
+    table don't need SQL.
+
+    The owner loads it once from the database, applies the deltas of its
+    own writes with apply() once they are committed, and calls validate()
+    with the database generation before reading so writes of other
+    processes are noticed. Deltas of a transaction that rolls back are
+    never applied.
+
+    Every method holds lock, which the owner can also hold to validate,
+    load and read without a commit being applied in between.
+
+    Attributes:
+        version (int):
+            bumped whenever the snapshot is loaded or dropped. A
+            transaction reads it before it commits, so apply() can tell
+            whether the snapshot was loaded meanwhile and may already hold
+            the transaction's writes.
+    '''
+
+    def __init__(self):
+        self._assets = None
+        self._names = None
+        self._generation = None
+        self.version = 0
+        self.lock = threading.RLock()
+
+    @property
+    def loaded(self):
+        return self._assets is not None
+
+    def validate(self, generation):
+        '''Drop the snapshot if generation differs from the last one seen.'''
+
+        with self.lock:
+            if generation != self._generation:
+                self.clear()
+                self._generation = generation
+
+    def load(self, assets):
+        '''Replace the snapshot with assets (iterable of tuple).
+
+        Arguments:
+            assets: (name, total, instock) of every asset.
+        '''
+
+        with self.lock:
+            self._assets = {
+                name: (total, instock) for name, total, instock in assets
+            }
+            self._names = sorted(self._assets)
+            self.version += 1
+
+    def get(self, name):
+        '''Get (name, total, instock) of asset, or None if it doesn't exist.'''
+
+        with self.lock:
+            try:
+                total, instock = self._assets[name]
+            except KeyError:
+                return None
+        return (name, total, instock)
+
+    def select(self, active_only=False, instock_only=False):
+        '''Get (name, total, instock) of assets like Model.get_assets.'''
+
+        assets = []
+        with self.lock:
+            for name in self._names:
+                total, instock = self._assets[name]
+                if active_only and total <= 0:
+                    continue
+                if instock_only and instock <= 0:
+                    continue
+                assets.append((name, total, instock))
+        return assets
+
+    def add(self, name, total=0, instock=0):
+        '''
+        Add to the total and instock of asset, creating it if it is new.
+        Does nothing if the snapshot isn't loaded.
+        '''
+
+        with self.lock:
+            if self._assets is None:
+                return
+            if name not in self._assets:
+                self._assets[name] = (0, 0)
+                insort(self._names, name)
+            old_total, old_instock = self._assets[name]
+            self._assets[name] = (old_total + total, old_instock + instock)
+
+    def apply(self, version, deltas):
+        '''
+        Add the deltas of a committed transaction. If the snapshot was
+        loaded after version was read, it may hold them already, so it is
+        dropped instead.
+
+        Arguments:
+            version (int): version read before the transaction committed.
+            deltas (dict): asset name to [total delta, instock delta].
+        '''
+
+        with self.lock:
+            if version != self.version:
+                self.clear()
+                return
+            for name, (total, instock) in deltas.items():
+                self.add(name, total, instock)
+
+    def clear(self):
+        with self.lock:
+            if self._assets is not None:
+                self.version += 1
+            self._assets = None
+            self._names = None
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class NameCache:
+    '''
+    Bounded map of names to row ids, evicting the least recently used.
+
+    The id of a borrower or asset never changes once the row exists, so an
+    entry can only go stale if the transaction that created the row rolls
+    back, or another process rewrites the database. The owner calls clear()
+    for the former and validate() with the database generation for the
+    latter. Every method holds a lock, so threads can share the cache, like
+    the observers a NotificationDispatcher runs on its own thread.
+
+    Attributes:
+        size (int): the maximum number of entries. 0 disables caching.
+        hits (int): lookups answered from the cache.
+        misses (int): lookups the cache could not answer.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def validate(self, generation):
+        '''Drop every entry if generation differs from the last one seen.'''
+
+        with self._lock:
+            if generation != self._generation:
+                self._ids.clear()
+                self._generation = generation
+
+    def get(self, name):
+        '''Get the id of name, or None if it is not cached.'''
+
+        with self._lock:
+            try:
+                self._ids.move_to_end(name)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._ids[name]
+
+    def put(self, name, id):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._ids[name] = id
+            self._ids.move_to_end(name)
+            if len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
@@ -1,14 +1,29 @@
 import weakref
 import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 """
 modified from:
 https://github.com/DanielSank/observed/tree/d99fb99ff2a470a86efb2763685e8e2c021e799f
 
-Simply adds a 'pass_arguments' flag for observers.
+Simply adds a 'pass_arguments' flag for observers, and a 'pass_changes' flag
+for observers of the changes an observed method publishes.
 """
 
 INSTANCE_OBSERVER_ATTR = "_observed__observers"
+INSTANCE_METHODS_ATTR = "_observed__methods"
+INSTANCE_THREAD_ATTR = "_observed__thread"
+INSTANCE_SCHEDULE_ATTR = "_observed__schedule"
+INSTANCE_PENDING_ATTR = "_observed__pending"
+INSTANCE_STATS_ATTR = "_observed__stats"
+INSTANCE_DISPATCHER_ATTR = "_observed__dispatcher"
+
+# Guards the state shared by the threads calling an instance's observable
+# methods: creating its ThreadState, and its pending notifications.
+_lock = threading.Lock()
 
 
 class ObserverFunction:
@@ -17,7 +32,11 @@ class ObserverFunction:
     does not prevent garbage collection of the observing function.
     """
 
-    def __init__(self, func, identify_observed, pass_arguments, weakref_info):
+    __slots__ = ('__wrapped__', 'func_wr', 'key', 'identify_observed',
+        'pass_arguments', 'pass_changes', 'dispatch')
+
+    def __init__(self, func, identify_observed, pass_arguments, weakref_info,
+        pass_changes=False):
         """Initialize an ObserverFunction.
         Args:
             func: function I wrap. I call this function when I am called.
@@ -33,34 +52,36 @@ class ObserverFunction:
                 the key in that dict which maps to me. When the function I wrap
                 is finalized, I use this information to delete myself from the
                 dictionary.
+            pass_changes: boolean indicating whether or not I will pass the
+                changes published by the observed call, before its arguments.
         """
 
-        # For some reason, if we put the update_wrapper after we make the
-        # weak reference to func, the call to weakref.ref returns a function
-        # instead of a weak ref. So, don't move the next line chomp, chomp...
-        functools.update_wrapper(self, func)
+        # functools.update_wrapper used to set __wrapped__, which holds func
+        # for as long as I am registered, so lambdas can be observers. Keep
+        # doing that, which also lets dispatch call func without the weak
+        # reference.
+        self.__wrapped__ = func
         self.identify_observed = identify_observed
         self.pass_arguments = pass_arguments
+        self.pass_changes = pass_changes
         key, d = weakref_info
+        self.key = key
         self.func_wr = weakref.ref(func, CleanupHandler(key, d))
+        self.dispatch = _make_dispatch(
+            func, None, identify_observed, pass_changes, pass_arguments)
 
-    def __call__(self, observed_obj, *arg, **kw):
+    def __call__(self, observed_obj, changes, *arg, **kw):
         """Call the function I wrap.
         Args:
             *arg: The arguments passed to me by the observed object.
             **kw: The keyword args passed to me by the observed object.
             observed_obj: The observed object which called me.
+            changes: tuple of the changes the observed call published.
         Returns:
             Whatever the function I wrap returns.
         """
 
-        if self.identify_observed and self.pass_arguments:
-            return self.func_wr()(observed_obj, *arg, **kw)
-        if self.identify_observed:
-            return self.func_wr()(observed_obj)
-        if self.pass_arguments:
-            return self.func_wr()(*arg, **kw)
-        return self.func_wr()()
+        return self.dispatch(observed_obj, changes, arg, kw)
 
 
 class ObserverBoundMethod:
@@ -69,8 +90,11 @@ class ObserverBoundMethod:
     being an observer does not prevent garbage collection of that instance.
     """
 
+    __slots__ = ('inst', 'method_name', 'key', 'identify_observed',
+        'pass_arguments', 'pass_changes', 'dispatch')
+
     def __init__(self, inst, method_name, identify_observed, pass_arguments,
-        weakref_info):
+        weakref_info, pass_changes=False):
         """Initialize an ObserverBoundMethod.
         Args:
             inst: the object to which the bound method I wrap is bound.
@@ -87,32 +111,166 @@ class ObserverBoundMethod:
                 the key in that dict which maps to me. When the function I wrap
                 is finalized, I use this information to delete myself from the
                 dictionary.
+            pass_changes: boolean indicating whether or not I will pass the
+                changes published by the observed call, before its arguments.
         """
 
         self.identify_observed = identify_observed
         self.pass_arguments = pass_arguments
+        self.pass_changes = pass_changes
         key, d = weakref_info
+        self.key = key
         self.inst = weakref.ref(inst, CleanupHandler(key, d))
         self.method_name = method_name
-
-    def __call__(self, observed_obj, *arg, **kw):
+        # Call the function behind the method on the instance, instead of
+        # looking the method up by name on every call.
+        func = getattr(getattr(inst, method_name), "__func__", None)
+        if func is None:
+            def func(inst, *arg, **kw):
+                return getattr(inst, method_name)(*arg, **kw)
+        self.dispatch = _make_dispatch(
+            func, self.inst, identify_observed, pass_changes, pass_arguments)
+
+    def __call__(self, observed_obj, changes, *arg, **kw):
         """Call the function I wrap.
         Args:
             *arg: The arguments passed to me by the observed object.
             **kw: The keyword args passed to me by the observed object.
             observed_obj: The observed object which called me.
+            changes: tuple of the changes the observed call published.
         Returns:
             Whatever the function I wrap returns.
         """
 
-        bound_method = getattr(self.inst(), self.method_name)
-        if self.identify_observed and self.pass_arguments:
-            return bound_method(observed_obj, *arg, **kw)
-        if self.identify_observed:
-            return bound_method(observed_obj)
-        if self.pass_arguments:
-            return bound_method(*arg, **kw)
-        return bound_method()
+        return self.dispatch(observed_obj, changes, arg, kw)
+
+
+def _make_dispatch(func, inst_wr, identify_observed, pass_changes,
+    pass_arguments):
+    """Build the callable which notifies an observer, once, when it is added.
+    The callable takes (observed_obj, changes, arg, kw) and calls func with
+    what the observer was registered to take, so notifying doesn't check the
+    flags every time. The usual kinds of observers get a callable of their
+    own; the rest share a general one.
+    Args:
+        func: the observing function, or the function of the observing
+            bound method.
+        inst_wr: weak reference to the instance of the observing bound
+            method, None for a function. Nothing is called once it is dead.
+        identify_observed, pass_changes, pass_arguments: See add_observer.
+    """
+
+    if identify_observed or (pass_changes and pass_arguments):
+        def dispatch(observed_obj, changes, arg, kw):
+            head = ()
+            if inst_wr is not None:
+                inst = inst_wr()
+                if inst is None:
+                    return None
+                head = (inst,)
+            if identify_observed:
+                head += (observed_obj,)
+            if pass_changes:
+                head += (changes,)
+            if pass_arguments:
+                return func(*head, *arg, **kw)
+            return func(*head)
+    elif inst_wr is None:
+        if pass_changes:
+            def dispatch(observed_obj, changes, arg, kw):
+                return func(changes)
+        elif pass_arguments:
+            def dispatch(observed_obj, changes, arg, kw):
+                return func(*arg, **kw)
+        else:
+            def dispatch(observed_obj, changes, arg, kw):
+                return func()
+    elif pass_changes:
+        def dispatch(observed_obj, changes, arg, kw):
+            inst = inst_wr()
+            if inst is not None:
+                return func(inst, changes)
+    elif pass_arguments:
+        def dispatch(observed_obj, changes, arg, kw):
+            inst = inst_wr()
+            if inst is not None:
+                return func(inst, *arg, **kw)
+    else:
+        def dispatch(observed_obj, changes, arg, kw):
+            inst = inst_wr()
+            if inst is not None:
+                return func(inst)
+    return dispatch
+
+
+def takes_arguments(observer):
+    """
+    Whether observer gets anything from a notification besides being called.
+    Observers that don't only need to hear that something happened.
+    """
+
+    return (observer.identify_observed or observer.pass_arguments
+        or observer.pass_changes)
+
+
+class ObserverDict(dict):
+    """The observers of an observable, keyed as ObservableFunction.make_key.
+    Notifying iterates snapshot(), a tuple of the observers which is only
+    rebuilt after observers were added or removed. Observers removed while
+    a notification runs are still called by it, as if removed after it.
+    """
+
+    __slots__ = ('_snapshot', '_wants_changes')
+
+    def __init__(self, *arg, **kw):
+        super().__init__(*arg, **kw)
+        self._snapshot = None
+        self._wants_changes = False
+
+    def snapshot(self):
+        """Get a tuple of my observers."""
+
+        if self._snapshot is None:
+            self._snapshot = tuple(self.values())
+            self._wants_changes = any(
+                observer.pass_changes for observer in self._snapshot)
+        return self._snapshot
+
+    @property
+    def wants_changes(self):
+        """Whether any of my observers takes the published changes."""
+
+        if self._snapshot is None:
+            self.snapshot()
+        return self._wants_changes
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._snapshot = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._snapshot = None
+
+    def pop(self, *arg):
+        self._snapshot = None
+        return super().pop(*arg)
+
+    def popitem(self):
+        self._snapshot = None
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self._snapshot = None
+        return super().setdefault(key, default)
+
+    def update(self, *arg, **kw):
+        self._snapshot = None
+        super().update(*arg, **kw)
+
+    def clear(self):
+        self._snapshot = None
+        super().clear()
 
 
 class ObservableFunction:
@@ -142,9 +300,10 @@ class ObservableFunction:
 
         functools.update_wrapper(self, func)
         self.func = func
-        self.observers = {}  # observer key -> observer
+        self.observers = ObserverDict()  # observer key -> observer
 
-    def add_observer(self, observer, identify_observed=False, pass_arguments=True):
+    def add_observer(self, observer, identify_observed=False, pass_arguments=True,
+        pass_changes=False):
         """Register an observer to observe me.
         Args:
             observer: The callable to register as an observer.
@@ -155,6 +314,8 @@ class ObservableFunction:
             pass_arguments: If True, then the observer will get my arguments
                 passed whenever it is invoked. See ObserverFunction and
                 ObserverBoundMethod to see how this works.
+            pass_changes: If True, then the observer will get a tuple of the
+                changes I published with publish_change, before my arguments.
         Returns:
             True if the observer was added, False otherwise.
         The observing function or method will be called whenever I am called,
@@ -168,18 +329,22 @@ class ObservableFunction:
 
         # If the observer is a bound method,
         if hasattr(observer, "__self__"):
-            result = self._add_bound_method(observer, identify_observed, pass_arguments)
+            result = self._add_bound_method(
+                observer, identify_observed, pass_arguments, pass_changes)
         # Otherwise, assume observer is a normal function.
         else:
-            result = self._add_function(observer, identify_observed, pass_arguments)
+            result = self._add_function(
+                observer, identify_observed, pass_arguments, pass_changes)
         return result
 
-    def _add_function(self, func, identify_observed, pass_arguments):
+    def _add_function(self, func, identify_observed, pass_arguments,
+        pass_changes=False):
         """Add a function as an observer.
         Args:
             func: The function to register as an observer.
             identify_observed: See docstring for add_observer.
             pass_arguments: See docstring for add_observer.
+            pass_changes: See docstring for add_observer.
         Returns:
             True if the function is added, otherwise False.
         """
@@ -187,17 +352,20 @@ class ObservableFunction:
         key = self.make_key(func)
         if key not in self.observers:
             self.observers[key] = ObserverFunction(
-                func, identify_observed, pass_arguments, (key, self.observers))
+                func, identify_observed, pass_arguments, (key, self.observers),
+                pass_changes)
             return True
         else:
             return False
 
-    def _add_bound_method(self, bound_method, identify_observed, pass_arguments):
+    def _add_bound_method(self, bound_method, identify_observed, pass_arguments,
+        pass_changes=False):
         """Add an bound method as an observer.
         Args:
             bound_method: The bound method to add as an observer.
             identify_observed: See the docstring for add_observer.
             pass_arguments: See the docstring for add_observer.
+            pass_changes: See the docstring for add_observer.
         Returns:
             True if the bound method is added, otherwise False.
         """
@@ -207,7 +375,8 @@ class ObservableFunction:
         key = self.make_key(bound_method)
         if key not in self.observers:
             self.observers[key] = ObserverBoundMethod(
-                inst, method_name, identify_observed, pass_arguments, (key, self.observers))
+                inst, method_name, identify_observed, pass_arguments,
+                (key, self.observers), pass_changes)
             return True
         else:
             return False
@@ -247,39 +416,42 @@ class ObservableFunction:
         Returns:
             Whatever the wrapped callable returns.
         Note:
-        I think it is possible for observers to disappear while we execute
-        them. It might be better to make strong references to all
-        observers before we start callback execution, since we don't keep
-        strong references elsewhere.
+        The observers called are those of the snapshot taken when the call
+        starts notifying, which holds strong references to them, so
+        observers removed meanwhile are still called this time. A bound
+        method whose instance has died is skipped.
         """
         result = self.func(*arg, **kw)
-        for key in self.observers:
-            self.observers[key](self, *arg, **kw)
+        for observer in self.observers.snapshot():
+            observer.dispatch(self, (), arg, kw)
         return result
 
 
 class ObservableBoundMethod(ObservableFunction):
     """I wrap a bound method and allow observers to be registered."""
 
-    def __init__(self, func, inst, observers):
+    def __init__(self, func, inst, observers, dispatch=None):
         """Initialize an ObservableBoundMethod.
         Args:
             func: The function (i.e. unbound method) I wrap.
             inst: The instance to which I am bound.
-            observers: Dict mapping keys unique to each observer to that
-                observer. This dict comes from the descriptor which generates
+            observers: ObserverDict mapping keys unique to each observer to
+                that observer. This dict comes from the descriptor which generates
                 this ObservableBoundMethod instance. In this way, multiple
                 instances of ObservableBoundMethod with the same underlying
                 object instance and method all add, remove, and call observers
                 from the same collection.
                 If you think this dict should probably be a set instead then
                 you probably grok this module.
+            dispatch: how my notifications are delivered. See
+                get_observable_method.
         """
 
         self.func = func
         functools.update_wrapper(self, func)
         self.inst = inst
         self.observers = observers
+        self.dispatch_mode = dispatch
 
     def __call__(self, *arg, **kw):
         """Invoke the bound method I wrap, and all of my observers.
@@ -291,17 +463,71 @@ class ObservableBoundMethod(ObservableFunction):
         Returns:
             Whatever the wrapped bound method returns.
         Note:
-        I think it is possible for observers to disappear while we execute
-        them. It might be better to make strong references to all
-        observers before we start callback execution, since we don't keep
-        strong references elsewhere.
+        The observers called are those of the snapshot taken when the call
+        starts notifying, which holds strong references to them, so
+        observers removed meanwhile are still called this time. A bound
+        method whose instance has died is skipped.
         """
 
-        result = self.func(self.inst, *arg, **kw)
-        for key in self.observers:
-            self.observers[key](self, *arg, **kw)
+        inst = self.inst
+        if inst is None:
+            raise ReferenceError(
+                f"The instance of {self.__name__} no longer exists")
+        observers = self.observers
+        state = get_thread_state(inst)
+        # Collect what the call publishes, if any observer wants it. A nested
+        # observable call collects its own changes for its own observers.
+        outer = state.changes
+        if outer is None and not observers.wants_changes:
+            result = self.func(inst, *arg, **kw)
+            changes = ()
+        else:
+            changes = [] if observers.wants_changes else None
+            state.changes = changes
+            try:
+                result = self.func(inst, *arg, **kw)
+            finally:
+                state.changes = outer
+            changes = tuple(changes) if changes else ()
+        notification = (self, changes, arg, kw)
+        if state.deferred is not None:
+            state.deferred.notifications.append(notification)
+            return result
+        if _pend(inst, [notification]):
+            return result
+        dispatcher = self._get_dispatcher()
+        if dispatcher is not None:
+            dispatcher.notify(self, observers.snapshot(), changes, arg, kw)
+        else:
+            for observer in observers.snapshot():
+                observer.dispatch(self, changes, arg, kw)
         return result
 
+    def _get_dispatcher(self):
+        """Get the NotificationDispatcher to deliver my notifications, if any."""
+
+        if self.dispatch_mode == 'sync':
+            return None
+        dispatcher = getattr(self.inst, INSTANCE_DISPATCHER_ATTR, None)
+        if dispatcher is None and self.dispatch_mode == 'async':
+            dispatcher = NotificationDispatcher()
+            setattr(self.inst, INSTANCE_DISPATCHER_ATTR, dispatcher)
+        return dispatcher
+
+    def notify(self, *arg, **kw):
+        """Call all of my observers as if I had been called."""
+
+        self.notify_changes((), *arg, **kw)
+
+    def notify_changes(self, changes, *arg, **kw):
+        """
+        Call all of my observers as if I had been called and published
+        changes.
+        """
+
+        for observer in self.observers.snapshot():
+            observer.dispatch(self, changes, arg, kw)
+
     def __eq__(self, other):
         """Check equality of this bound method with another."""
 
@@ -316,6 +542,25 @@ class ObservableBoundMethod(ObservableFunction):
         return self.inst
 
 
+class CachedObservableBoundMethod(ObservableBoundMethod):
+    """An ObservableBoundMethod cached on its instance.
+    I refer to my instance only weakly, so the instance holding me doesn't
+    hold itself: it is freed as soon as its last reference goes. Like a
+    weakref.WeakMethod, I don't keep it alive either, and calling me once it
+    is gone raises ReferenceError.
+    """
+
+    @property
+    def inst(self):
+        """The instance to which I'm bound, or None if it no longer exists."""
+
+        return self._inst_ref()
+
+    @inst.setter
+    def inst(self, inst):
+        self._inst_ref = weakref.ref(inst)
+
+
 """
 The following two classes are descriptors which manage access to observable
 methods. Suppose we have a class Foo with method bar, and suppose we have an
@@ -343,19 +588,37 @@ class ObservableMethodManager_PersistOnInstances:
     """I manage access to observable methods.
     When accessed through an instance I return an ObservableBoundMethod.
     When accessed through a class I return an ObservableUnboundMethod.
-    When an instance accesses me, I create an ObservableBoundMethod for that
-    instance and return it.
+    The first time an instance accesses me, I create a
+    CachedObservableBoundMethod for that instance and keep it in a dict in
+    the instance's __dict__, then return it on every later access. It refers
+    to the instance weakly, so the cache forms no reference cycle. A copy of
+    the instance shares that dict at first, and gets its own on its first
+    access. Instances without a __dict__, or that can't be weakly
+    referenced, get a new ObservableBoundMethod on every access.
     """
 
-    def __init__(self, func):
+    def __init__(self, func, dispatch=None):
         """Initialize an ObservableMethodManager_PersistOnInstances.
         Args:
             func: the function (i.e.unbound method) I manage.
+            dispatch: See get_observable_method.
         """
 
         self._func = func
+        self._dispatch = dispatch
+        self._name = func.__name__
         self._unbound_method = ObservableUnboundMethod(self)
 
+    def __set_name__(self, owner, name):
+        """Remember the name I am stored under, to cache under it."""
+
+        self._name = name
+
+    def __set__(self, inst, val):
+        """Disallow setting because we don't guarantee behavior."""
+
+        raise RuntimeError("Assignment not supported")
+
     def __get__(self, inst, cls):
         """Return an ObservableBoundMethod or ObservableUnboundMethod.
         If accessed by instance, I return an ObservableBoundMethod which
@@ -369,19 +632,37 @@ class ObservableMethodManager_PersistOnInstances:
 
         if inst is None:
             return self._unbound_method
+        try:
+            methods = inst.__dict__[INSTANCE_METHODS_ATTR]
+        except (AttributeError, KeyError):
+            methods = None
         else:
-            if not hasattr(inst, INSTANCE_OBSERVER_ATTR):
-                d = {}
-                setattr(inst, INSTANCE_OBSERVER_ATTR, d)
-            else:
-                d = getattr(inst, INSTANCE_OBSERVER_ATTR)
-            observers = d.setdefault(self._func.__name__, {})
-        return ObservableBoundMethod(self._func, inst, observers)
-
-    def __set__(self, inst, val):
-        """Disallow setting because we don't guarantee behavior."""
-
-        raise RuntimeError("Assignment not supported")
+            bound_method = methods.get(self._name)
+            if bound_method is not None:
+                if bound_method._inst_ref() is not inst:
+                    # copied along with the __dict__ of another instance
+                    methods = None
+                elif bound_method.func is self._func:
+                    # else the method of a subclass, cached under the same name
+                    return bound_method
+        if not hasattr(inst, INSTANCE_OBSERVER_ATTR):
+            d = {}
+            setattr(inst, INSTANCE_OBSERVER_ATTR, d)
+        else:
+            d = getattr(inst, INSTANCE_OBSERVER_ATTR)
+        observers = d.get(self._func.__name__)
+        if observers is None:
+            observers = d[self._func.__name__] = ObserverDict()
+        try:
+            bound_method = CachedObservableBoundMethod(
+                self._func, inst, observers, self._dispatch)
+            if methods is None:
+                methods = inst.__dict__[INSTANCE_METHODS_ATTR] = {}
+        except (AttributeError, TypeError):
+            return ObservableBoundMethod(
+                self._func, inst, observers, self._dispatch)
+        methods[self._name] = bound_method
+        return bound_method
 
 
 class ObservableMethodManager_PersistOnDescriptor:
@@ -409,11 +690,13 @@ class ObservableMethodManager_PersistOnDescriptor:
     # instances themselves, which is done by
     #   ObservableMethodManager_PersistOnInstances.
 
-    def __init__(self, func):
+    def __init__(self, func, dispatch=None):
         """Initialize an ObservableMethodManager_PersistOnDescriptor.
         func is the function I will give to the ObservableBoundMethods I create.
+        dispatch is how they deliver notifications; see get_observable_method.
         """
         self._func = func
+        self._dispatch = dispatch
         self._unbound_method = ObservableUnboundMethod(self)
         # instance id -> (inst weak ref, observers)
         self.instances = {}
@@ -442,9 +725,10 @@ class ObservableMethodManager_PersistOnDescriptor:
                 raise RuntimeError(msg)
         else:
             wr = weakref.ref(inst, CleanupHandler(inst_id, self.instances))
-            observers = {}
+            observers = ObserverDict()
             self.instances[inst_id] = (wr, observers)
-        return ObservableBoundMethod(self._func, inst, observers)
+        return ObservableBoundMethod(
+            self._func, inst, observers, self._dispatch)
 
     def __set__(self, inst, val):
         """Disallow setting because we don't guarantee behavior."""
@@ -498,6 +782,403 @@ class CleanupHandler:
             del self.d[self.key]
 
 
+class NotificationStats:
+    """Counts of the queued notifications of an instance.
+    Attributes:
+        delivered: observer calls made when queues were delivered.
+        coalesced: observer calls saved because the observer had already
+            been called for the same queue.
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self.coalesced = 0
+
+
+def get_notification_stats(inst):
+    """Get the NotificationStats of inst, kept as an attribute of inst."""
+    stats = getattr(inst, INSTANCE_STATS_ATTR, None)
+    if stats is None:
+        stats = NotificationStats()
+        setattr(inst, INSTANCE_STATS_ATTR, stats)
+    return stats
+
+
+class NotificationQueue:
+    """Notifications of an instance's observable methods held back for later.
+    When coalescing, an observer that takes no arguments only needs to know
+    that something changed, so it is called once however many queued
+    notifications it observes, at the place of the first. So is an observer
+    that only takes changes, with the changes of all those notifications.
+    Other observers that take arguments are called for every notification.
+    """
+
+    def __init__(self, inst, coalesce):
+        """Initialize a NotificationQueue.
+        Args:
+            inst: the instance whose notifications I hold.
+            coalesce: whether to call argument-less observers only once.
+        """
+        self.inst = inst
+        self.coalesce = coalesce
+        self.notifications = []
+
+    def append(self, observable, changes, arg, kw):
+        """Queue a call of observable's observers with changes, arg and kw."""
+        self.notifications.append((observable, changes, arg, kw))
+
+    def deliver(self, call=None):
+        """Call the observers of the queued notifications in order.
+        Args:
+            call: if given, called with (observer, observable, changes, arg,
+                kw) to call each observer, as NotificationDispatcher.call.
+        """
+        stats = get_notification_stats(self.inst)
+        merged = {}
+        if self.coalesce:
+            for observable, changes, arg, kw in self.notifications:
+                for observer in observable.observers.snapshot():
+                    if _takes_changes_only(observer):
+                        merged.setdefault(observer.key, []).extend(changes)
+        called = set()
+        for observable, changes, arg, kw in self.notifications:
+            for observer in observable.observers.snapshot():
+                published = changes
+                key = observer.key
+                if self.coalesce and (
+                        key in merged or not takes_arguments(observer)):
+                    if key in called:
+                        stats.coalesced += 1
+                        continue
+                    called.add(key)
+                    if key in merged:
+                        published = tuple(merged[key])
+                stats.delivered += 1
+                if call is None:
+                    observer.dispatch(observable, published, arg, kw)
+                else:
+                    call(observer, observable, published, arg, kw)
+
+
+def _takes_changes_only(observer):
+    return (observer.pass_changes
+        and not (observer.identify_observed or observer.pass_arguments))
+
+
+class ThreadState(threading.local):
+    """The state of an instance's observable methods in one thread.
+    Each thread calling them sees its own, so a thread's deferred
+    notifications and published changes never pick up another's calls.
+    Attributes:
+        deferred: the NotificationQueue of the thread's deferred_notifications
+            block, None outside one.
+        changes: list collecting the changes published by the thread's
+            running observable method, None if nothing collects them.
+    """
+
+    deferred = None
+    changes = None
+
+
+def get_thread_state(inst):
+    """Get the ThreadState of inst, kept as an attribute of inst."""
+    state = getattr(inst, INSTANCE_THREAD_ATTR, None)
+    if state is None:
+        with _lock:
+            state = getattr(inst, INSTANCE_THREAD_ATTR, None)
+            if state is None:
+                state = ThreadState()
+                setattr(inst, INSTANCE_THREAD_ATTR, state)
+    return state
+
+
+def publishing_changes(inst):
+    """
+    Whether the observable method of inst running now in this thread has
+    observers for its changes, so changes that cost work to describe can be
+    skipped.
+    """
+
+    state = getattr(inst, INSTANCE_THREAD_ATTR, None)
+    return state is not None and state.changes is not None
+
+
+def publish_change(inst, change):
+    """
+    Publish a change made by the observable method of inst running now in
+    this thread, for its observers registered with pass_changes. Does
+    nothing outside an observable method.
+    Args:
+        inst: the instance whose observable method is running.
+        change: anything describing the change.
+    """
+
+    state = getattr(inst, INSTANCE_THREAD_ATTR, None)
+    if state is not None and state.changes is not None:
+        state.changes.append(change)
+
+
+@contextmanager
+def deferred_notifications(inst, coalesce=False):
+    """Hold back the observers of inst's observable methods.
+    Inside the with block, calling an observable method of inst runs the
+    method right away, but its observers are queued. When the block exits
+    normally, the queued notifications are delivered in call order. If the
+    block raises, they are dropped, so observers never hear about work that
+    was rolled back. Nested blocks on the same instance join the outermost
+    one, which is the only one to deliver.
+    If inst coalesces notifications (see coalesce_notifications), the queue
+    is handed on to the pending notifications instead of delivered. If inst
+    has a NotificationDispatcher, it delivers the queue.
+    Only the calling thread's calls are held back, in the queue of its
+    ThreadState. Calls other threads make meanwhile notify as usual, and are
+    never dropped with the block's.
+    Args:
+        inst: the instance whose observable methods to hold back.
+        coalesce: whether argument-less observers are called only once for
+            the whole block. See NotificationQueue.
+    """
+    state = get_thread_state(inst)
+    if state.deferred is not None:
+        yield
+        return
+    deferred = NotificationQueue(inst, coalesce)
+    state.deferred = deferred
+    try:
+        yield
+    finally:
+        state.deferred = None
+    if not _pend(inst, deferred.notifications):
+        _deliver(inst, deferred)
+
+
+def coalesce_notifications(inst, schedule):
+    """Coalesce the notifications of inst's observable methods.
+    From now on, the first notification queues a flush with schedule, and
+    every notification until the flush runs joins the same coalescing queue.
+    With a GUI, schedule can run the flush on the next turn of the event
+    loop, so each argument-less observer runs at most once per turn
+    however many observable methods were called.
+    Args:
+        inst: the instance whose observable methods to coalesce.
+        schedule: callable taking a callable to run later, for example
+            lambda flush: QtCore.QTimer.singleShot(0, flush).
+            None to stop coalescing; anything pending is delivered first.
+    """
+    if schedule is None:
+        flush_notifications(inst)
+    setattr(inst, INSTANCE_SCHEDULE_ATTR, schedule)
+
+
+def _pend(inst, notifications):
+    """
+    Add notifications to those waiting for the scheduled flush of inst,
+    scheduling one if none is. Returns False if inst doesn't coalesce
+    notifications, True if they were added.
+    """
+    if getattr(inst, INSTANCE_SCHEDULE_ATTR, None) is None:
+        return False
+    # Any thread may add while the flush takes the queue on another.
+    with _lock:
+        schedule = getattr(inst, INSTANCE_SCHEDULE_ATTR, None)
+        if schedule is None:
+            return False
+        pending = getattr(inst, INSTANCE_PENDING_ATTR, None)
+        started = pending is None
+        if started:
+            pending = NotificationQueue(inst, coalesce=True)
+            setattr(inst, INSTANCE_PENDING_ATTR, pending)
+        pending.notifications.extend(notifications)
+    if started:
+        schedule(functools.partial(flush_notifications, inst))
+    return True
+
+
+def flush_notifications(inst):
+    """Deliver the pending notifications of inst now, if there are any."""
+    with _lock:
+        pending = getattr(inst, INSTANCE_PENDING_ATTR, None)
+        if pending is None:
+            return
+        # Notifications made from now on start the next queue.
+        setattr(inst, INSTANCE_PENDING_ATTR, None)
+    _deliver(inst, pending)
+
+
+def _deliver(inst, queue):
+    dispatcher = getattr(inst, INSTANCE_DISPATCHER_ATTR, None)
+    if dispatcher is None:
+        queue.deliver()
+    else:
+        dispatcher.deliver(queue)
+
+
+class NotificationDispatcher:
+    """Delivers notifications away from the call that made them.
+    Notifications are run by an executor, one at a time in the order they
+    were made, so every observer hears about calls in order. Each observer
+    is called on its own: if it raises, the exception is recorded and
+    handed to on_error, and the other observers are still called. The
+    observed call never sees it.
+    Observers run on the executor's thread while other threads go on
+    calling the observed instance, so they must be thread-safe: whatever
+    they read, the observed methods may be changing meanwhile. Give an
+    executor that runs them on the thread that owns that state, like a
+    GUI's event loop, or lock it.
+    Attributes:
+        errors: deque of (observer, exception) of the latest failures.
+        failed: the number of observer calls that raised.
+    """
+
+    def __init__(self, executor=None, on_error=None, max_errors=100):
+        """Initialize a NotificationDispatcher.
+        Args:
+            executor: runs my deliveries; anything with a submit(fn) method,
+                like a concurrent.futures.Executor. For a GUI, submit can
+                post fn to the event loop through a queued connection. None
+                for a thread of my own, started when first needed.
+            on_error: called with (observer, exception) when an observer
+                raises. Runs on the delivering thread.
+            max_errors: how many failures errors keeps.
+        """
+
+        self._executor = executor
+        self._own_executor = executor is None
+        self.on_error = on_error
+        self.errors = deque(maxlen=max_errors)
+        self.failed = 0
+        self._tasks = deque()
+        self._scheduled = False
+        self._draining = None
+        self._idle = threading.Condition()
+
+    def notify(self, observable, observers, changes, arg, kw):
+        """Queue a call of observers (tuple) as observable's notification."""
+
+        self._submit(functools.partial(
+            self._notify, observable, observers, changes, arg, kw))
+
+    def deliver(self, queue):
+        """Queue the delivery of a NotificationQueue."""
+
+        self._submit(functools.partial(queue.deliver, self.call))
+
+    def call(self, observer, observable, changes, arg, kw):
+        """Call observer for a notification, recording what it raises."""
+
+        try:
+            observer.dispatch(observable, changes, arg, kw)
+        except Exception as exception:
+            self.failed += 1
+            self.errors.append((observer, exception))
+            if self.on_error is not None:
+                self.on_error(observer, exception)
+
+    def flush(self, timeout=None):
+        """Wait until every notification queued so far has been delivered.
+        Notifications no delivery has started on yet are delivered on the
+        calling thread, so this also works when the executor runs them on
+        this thread's own event loop.
+        Args:
+            timeout: the most seconds to wait. None for no limit.
+        Returns:
+            True if everything was delivered, False on timeout.
+        Raises:
+            RuntimeError: if called by an observer I am calling.
+        """
+
+        with self._idle:
+            if self._draining == threading.get_ident():
+                raise RuntimeError("flush called from a notification")
+            take_over = self._draining is None and bool(self._tasks)
+            if take_over:
+                self._draining = threading.get_ident()
+        if take_over:
+            self._run_tasks()
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: self._draining is None and not self._tasks, timeout)
+
+    def shutdown(self):
+        """Deliver everything queued, then stop my own thread if I have one."""
+
+        self.flush()
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _notify(self, observable, observers, changes, arg, kw):
+        for observer in observers:
+            self.call(observer, observable, changes, arg, kw)
+
+    def _submit(self, task):
+        with self._idle:
+            self._tasks.append(task)
+            if self._scheduled:
+                return
+            self._scheduled = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="notifications")
+            executor = self._executor
+        executor.submit(self._drain)
+
+    def _drain(self):
+        # Only one thread delivers at a time, which keeps the order. A drain
+        # finding another under way leaves the queue to it.
+        with self._idle:
+            if self._draining is not None:
+                return
+            self._draining = threading.get_ident()
+        self._run_tasks()
+
+    def _run_tasks(self):
+        while True:
+            with self._idle:
+                if not self._tasks:
+                    self._draining = None
+                    self._scheduled = False
+                    self._idle.notify_all()
+                    return
+                task = self._tasks.popleft()
+            try:
+                task()
+            except Exception:
+                # Observers' exceptions are caught by call; this would be
+                # a bug here, which mustn't stop later deliveries.
+                self.failed += 1
+
+
+def dispatch_notifications(inst, dispatcher):
+    """Deliver the notifications of inst's observable methods asynchronously.
+    From now on, observable methods of inst return without waiting for
+    their observers, which dispatcher calls later. Methods made observable
+    with dispatch='sync' still notify synchronously.
+    Args:
+        inst: the instance whose observable methods to dispatch.
+        dispatcher: a NotificationDispatcher. None to notify synchronously
+            again, once the old dispatcher has delivered everything.
+    """
+    if dispatcher is None:
+        wait_for_notifications(inst)
+    setattr(inst, INSTANCE_DISPATCHER_ATTR, dispatcher)
+
+
+def wait_for_notifications(inst, timeout=None):
+    """
+    Deliver the pending notifications of inst, and wait until its
+    NotificationDispatcher, if it has one, has delivered everything.
+    Meant for tests. See NotificationDispatcher.flush.
+    Returns:
+        True if everything was delivered, False on timeout.
+    """
+    flush_notifications(inst)
+    dispatcher = getattr(inst, INSTANCE_DISPATCHER_ATTR, None)
+    if dispatcher is None:
+        return True
+    return dispatcher.flush(timeout)
+
+
 def observable_function(func):
     """Decorate a function to make it observable.
     Use me as a decorator on a function, like this:
@@ -522,7 +1203,7 @@ def observable_function(func):
     return ObservableFunction(func)
 
 
-def get_observable_method(func, strategy):
+def get_observable_method(func, strategy, dispatch=None):
     """Decorate a method to make it observable.
     You can use me as a decorator on a method, like this:
         class Foo:
@@ -574,14 +1255,23 @@ def get_observable_method(func, strategy):
             strategy in which the observers are stored in the descriptor,
             call me explicitly on the function (unbound method) you want to
             make observable and set strategy='descriptor'.
+        dispatch: how observers are notified when no queue holds the
+            notification back. None follows the instance: synchronously,
+            unless dispatch_notifications gave it a NotificationDispatcher.
+            'async' always goes through the instance's dispatcher, which is
+            created with a thread of its own if it has none. 'sync' always
+            notifies before the method returns.
     """
+    if dispatch not in (None, 'sync', 'async'):
+        raise ValueError(f"Dispatch {dispatch} not recognized")
     if strategy == 'instances':
-        return ObservableMethodManager_PersistOnInstances(func)
+        return ObservableMethodManager_PersistOnInstances(func, dispatch)
     elif strategy == 'descriptor':
-        return ObservableMethodManager_PersistOnDescriptor(func)
+        return ObservableMethodManager_PersistOnDescriptor(func, dispatch)
     else:
         raise ValueError(f"Strategy {strategy} not recognized")
 
 
-def observable_method(strategy='instances'):
-    return lambda func: get_observable_method(func, strategy=strategy)
+def observable_method(strategy='instances', dispatch=None):
+    return lambda func: get_observable_method(
+        func, strategy=strategy, dispatch=dispatch)
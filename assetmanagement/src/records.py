@@ -0,0 +1,145 @@
+import csv
+import json
+import os
+from datetime import date
+from itertools import islice
+
+FORMATS = ('csv', 'jsonl')
+
+def get_format(source, format=None):
+    '''Pick the record format of source.
+
+    Arguments:
+        source (str or file): a path or an open text file.
+        format (str): 'csv' or 'jsonl'. None means guess from the file name.
+
+    Returns:
+        str: 'csv' or 'jsonl'.
+
+    Raises:
+        ValueError: if format is unknown or can't be guessed.
+    '''
+
+    if format is None:
+        name = source if isinstance(source, (str, os.PathLike)) \
+            else getattr(source, 'name', '')
+        format = os.path.splitext(str(name))[1].lstrip('.').lower()
+    if format not in FORMATS:
+        raise ValueError('Unknown record format: {}'.format(format))
+    return format
+
+def read_records(source, format=None):
+    '''Stream records from a CSV (with header) or JSONL file.
+
+    Arguments:
+        source (str or file): a path or an open text file.
+        format (str): 'csv' or 'jsonl'. None means guess from the file name.
+
+    Yields:
+        tuple: (row_number, record)
+            row_number counts data rows from 1.
+            record is a dict, or a ValueError if the row can't be parsed.
+    '''
+
+    format = get_format(source, format)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8') as f:
+            yield from read_records(f, format)
+        return
+    if format == 'csv':
+        for row_number, record in enumerate(csv.DictReader(source), 1):
+            yield row_number, record
+    else:
+        row_number = 0
+        for line in source:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('expected an object')
+            except ValueError as e:
+                record = ValueError('malformed JSON: {}'.format(e))
+            yield row_number, record
+
+def write_records(path, fieldnames, rows, format=None):
+    '''Write rows to a CSV (with header) or JSONL file one at a time.
+
+    Arguments:
+        path (str): the file to write.
+        fieldnames (tuple of str): the name of each column of the rows.
+        rows (iterable of tuple): the rows to write.
+        format (str): 'csv' or 'jsonl'. None means guess from the file name.
+
+    Returns:
+        int: the number of rows written.
+
+    Raises:
+        ValueError: if format is unknown.
+    '''
+
+    format = get_format(path, format)
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            for row in rows:
+                writer.writerow(
+                    value.isoformat() if isinstance(value, date) else value
+                    for value in row)
+                count += 1
+        else:
+            for row in rows:
+                record = dict(zip(fieldnames, row))
+                f.write(json.dumps(record, default=date.isoformat,
+                    ensure_ascii=False))
+                f.write('\n')
+                count += 1
+    return count
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+def get_name(record, key='name'):
+    name = record.get(key)
+    if not isinstance(name, str):
+        raise ValueError('missing {}'.format(key))
+    return name
+
+def get_quantity(record, positive=False):
+    try:
+        quantity = int(record.get('quantity'))
+    except (TypeError, ValueError):
+        raise ValueError('quantity must be an integer')
+    if quantity < 0 or (positive and quantity == 0):
+        raise ValueError('quantity must be {}'.format(
+            'positive' if positive else 'non negative'))
+    return quantity
+
+def get_date(record, key):
+    value = record.get(key)
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('{} must be a YYYY-MM-DD date'.format(key))
+
+def get_flag(record, key, default=False):
+    value = record.get(key)
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y'):
+        return True
+    if text in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError('{} must be true or false'.format(key))
@@ -0,0 +1,166 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+
+
+class ReservationIndex:
+    '''
+    Quantity of each asset reserved on each day, kept as a step function per
+    asset so the peak over a date range takes a couple of bisections instead
+    of a scan of every overlapping reservation.
+
+    Each asset has a sorted list of days where the reserved quantity
+    changes, and the quantity from each of those days until the next one.
+    Days are date ordinals, and a reservation covers datefrom to dateto
+    inclusive. Like Inventory, the owner loads it from the database, applies
+    its own writes, validates it with the database generation and clears it
+    when a transaction rolls back.
+
+    Every method holds lock, which the owner can also hold to validate,
+    load and read without another thread clearing the index in between.
+    '''
+
+    def __init__(self):
+        self._reservations = None
+        self._steps = None
+        self._generation = None
+        self.lock = threading.RLock()
+
+    @property
+    def loaded(self):
+        return self._reservations is not None
+
+    def validate(self, generation):
+        '''Drop the index if generation differs from the last one seen.'''
+
+        with self.lock:
+            if generation != self._generation:
+                self.clear()
+                self._generation = generation
+
+    def load(self, reservations):
+        '''Replace the index with reservations (iterable of tuple).
+
+        Arguments:
+            reservations: (id, asset_id, datefrom, dateto, quantity) of every
+                reservation.
+        '''
+
+        with self.lock:
+            self._reservations = {}
+            changes = defaultdict(lambda: defaultdict(int))
+            for reservation_id, asset_id, datefrom, dateto, quantity \
+                    in reservations:
+                self._reservations[reservation_id] = \
+                    (asset_id, datefrom, dateto, quantity)
+                changes[asset_id][datefrom.toordinal()] += quantity
+                changes[asset_id][dateto.toordinal() + 1] -= quantity
+            self._steps = {}
+            for asset_id, deltas in changes.items():
+                days = sorted(deltas)
+                levels = []
+                level = 0
+                for day in days:
+                    level += deltas[day]
+                    levels.append(level)
+                self._steps[asset_id] = (days, levels)
+
+    def add(self, reservation_id, asset_id, datefrom, dateto, quantity):
+        '''
+        Add a reservation. Does nothing if the index isn't loaded or
+        already has it.
+        '''
+
+        with self.lock:
+            if self._reservations is None \
+                    or reservation_id in self._reservations:
+                return
+            self._reservations[reservation_id] = \
+                (asset_id, datefrom, dateto, quantity)
+            self._change(asset_id, datefrom, dateto, quantity)
+
+    def remove(self, reservation_id):
+        '''
+        Remove a reservation. Does nothing if the index isn't loaded or
+        doesn't have it.
+        '''
+
+        with self.lock:
+            if self._reservations is None:
+                return
+            reservation = self._reservations.pop(reservation_id, None)
+            if reservation is None:
+                return
+            asset_id, datefrom, dateto, quantity = reservation
+            self._change(asset_id, datefrom, dateto, -quantity)
+
+    def _change(self, asset_id, datefrom, dateto, quantity):
+        days, levels = self._steps.setdefault(asset_id, ([], []))
+        first = self._split(days, levels, datefrom.toordinal())
+        last = self._split(days, levels, dateto.toordinal() + 1)
+        for i in range(first, last):
+            levels[i] += quantity
+        # drop the steps that no longer change anything, last one first
+        for i in (last, first):
+            previous = levels[i - 1] if i > 0 else 0
+            if i < len(days) and levels[i] == previous:
+                del days[i]
+                del levels[i]
+
+    @staticmethod
+    def _split(days, levels, day):
+        # index of the step starting at day, adding it if needed
+        i = bisect_left(days, day)
+        if i == len(days) or days[i] != day:
+            days.insert(i, day)
+            levels.insert(i, levels[i - 1] if i > 0 else 0)
+        return i
+
+    def get_last_day(self, asset_id):
+        '''Get the last day any of an asset is reserved, or None.'''
+
+        with self.lock:
+            days, _ = self._steps.get(asset_id, ((), ()))
+            if not days:
+                return None
+            # the last step is the day after the last reservation ends
+            return date.fromordinal(days[-1] - 1)
+
+    def get_peak(self, asset_id, datefrom, dateto, base=0, changes=()):
+        '''
+        Get the most demanded of an asset on any day of a date range:
+        reservations plus other demand given by base and changes.
+
+        Arguments:
+            asset_id (int): the asset.
+            datefrom, dateto (date): the range, inclusive.
+            base (int): other demand on datefrom.
+            changes (iterable of tuple): (date, delta) of the other demand
+                from days after datefrom on.
+
+        Returns:
+            int: the peak.
+        '''
+
+        with self.lock:
+            days, levels = self._steps.get(asset_id, ((), ()))
+            first = bisect_right(days, datefrom.toordinal())
+            last = bisect_right(days, dateto.toordinal())
+            level = levels[first - 1] if first > 0 else 0
+            steps = dict(zip(days[first:last], levels[first:last]))
+        peak = level + base
+        deltas = defaultdict(int)
+        for day, delta in changes:
+            deltas[day.toordinal()] += delta
+        # both change at the same days, so walk them together
+        for day in sorted(steps.keys() | deltas.keys()):
+            level = steps.get(day, level)
+            base += deltas.get(day, 0)
+            peak = max(peak, level + base)
+        return peak
+
+    def clear(self):
+        with self.lock:
+            self._reservations = None
+            self._steps = None
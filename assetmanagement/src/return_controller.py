@@ -1,6 +1,7 @@
 from PyQt5 import QtCore, QtWidgets
 
 from return_view import ReturnView
+from utils import enable_search
 
 class ReturnController:
     def __init__(self, model):
@@ -8,6 +9,11 @@ class ReturnController:
         self.view = ReturnView(self.dialog)
         self.model = model
 
+        enable_search(
+            self.view.comboBox_Borrower,
+            lambda text: self.model.search_borrowers(text, active_only=True)
+        )
+
         self.view.comboBox_Borrower.currentIndexChanged \
             .connect(self.update_asset_list)
         self.view.buttonBox.accepted \
@@ -23,6 +29,10 @@ class ReturnController:
             self.update_borrower_combobox,
             pass_arguments=False
         )
+        self.model.import_borrowers.add_observer(
+            self.update_borrower_combobox,
+            pass_arguments=False
+        )
         self.model.borrow_asset.add_observer(
             self.update_asset_list,
             pass_arguments=False
@@ -31,6 +41,18 @@ class ReturnController:
             self.update_asset_list,
             pass_arguments=False
         )
+        self.model.borrow_assets.add_observer(
+            self.update_asset_list,
+            pass_arguments=False
+        )
+        self.model.return_assets.add_observer(
+            self.update_asset_list,
+            pass_arguments=False
+        )
+        self.model.import_loans.add_observer(
+            self.update_asset_list,
+            pass_arguments=False
+        )
 
     def run(self):
         self.reset()
@@ -42,7 +64,7 @@ class ReturnController:
         self.update_asset_list()
 
     def update_borrower_combobox(self):
-        borrower_names = self.model.get_borrower_names(active_only=True)
+        borrower_names = self.model.search_borrowers('', active_only=True)
         self.view.update_borrower_combobox(borrower_names)
 
     def update_asset_list(self):
@@ -50,21 +72,13 @@ class ReturnController:
         if borrower_name is None:
             assets = []
         else:
-            loans = self.model.get_loans(
-                borrower_name=borrower_name,
-                active_only=True
-            )
-            count = dict()
-            for loan in loans:
-                asset_name = loan[1]
-                quantity = loan[2]
-                count[asset_name] = count.get(asset_name, 0) + quantity
-            assets = list(k+' ({})'.format(v) for k, v in count.items())
-            assets.sort()
+            outstanding = self.model.get_outstanding(
+                by='asset', borrower_name=borrower_name)
+            assets = list(k+' ({})'.format(v) for k, v in outstanding)
         self.view.update_asset_list(assets)
 
     def return_asset(self):
         borrower_name, asset_names = self.view.get_return_arguments()
-        for asset_name in asset_names:
-            self.model.return_asset(borrower_name, asset_name)
+        if asset_names:
+            self.model.return_assets(borrower_name, asset_names)
         self.dialog.accept()
@@ -1,8 +1,54 @@
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
 def error_message(parent, message):
     QtWidgets.QMessageBox.warning(
         parent,
         'Error',
         message,
-        QtWidgets.QMessageBox.Ok)
\ No newline at end of file
+        QtWidgets.QMessageBox.Ok)
+
+def enable_search(combobox, search):
+    '''
+    Make combobox editable and refill its items with search(text) as the
+    user types, so it never has to hold every name.
+    Picking an item changes the current index as usual; typed text alone
+    leaves it at -1.
+    '''
+
+    combobox.setEditable(True)
+    combobox.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+    combobox.completer().setCompletionMode(
+        QtWidgets.QCompleter.UnfilteredPopupCompletion)
+
+    def refill(text):
+        combobox.blockSignals(True)
+        combobox.clear()
+        combobox.addItems(search(text))
+        combobox.setCurrentIndex(-1)
+        combobox.setEditText(text)
+        combobox.blockSignals(False)
+        if text:
+            combobox.completer().complete()
+
+    combobox.lineEdit().textEdited.connect(refill)
+
+
+class QueuedExecutor(QtCore.QObject):
+    '''
+    Runs callables on the thread of the event loop it was made on, through a
+    queued connection, so submit is safe from any thread. Use it as the
+    executor of a NotificationDispatcher so observers that touch widgets
+    run on the GUI thread.
+    '''
+
+    _called = QtCore.pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._called.connect(self._call, QtCore.Qt.QueuedConnection)
+
+    def submit(self, function):
+        self._called.emit(function)
+
+    def _call(self, function):
+        function()
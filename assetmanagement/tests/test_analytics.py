@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from assetmanagement.src.analytics import (LoanHistory, Utilization,
+                                           get_availability_calendar)
+from assetmanagement.src.database import Database, Loan
+from assetmanagement.src.model import Model
+
+ENGINE = 'sqlite:///:memory:'
+
+def day(n):
+    return datetime(2020, 1, 1) + timedelta(days=n)
+
+def setup():
+    database = Database(ENGINE)
+    model = Model(database)
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    model.add_asset(name='Marker', quantity=5)
+    model.add_asset(name='Eraser', quantity=0)
+    loans = [
+        # asset_id, quantity, borrowed_at, returned_at
+        (1, 2, day(0), day(2)),
+        (1, 3, day(1), day(5)),
+        (1, 1, day(5), None),
+        (1, 4, None, None),
+        (2, 5, day(-2), day(1)),
+        (2, 1, day(19), day(20)),
+    ]
+    with database.get_session() as session:
+        # Core, as the ORM would fill a None borrowed_at with its default
+        session.execute(Loan.__table__.insert(), [
+            {
+                'borrower_id': 1,
+                'asset_id': asset_id,
+                'quantity': quantity,
+                'datedue': date(2020, 2, 1),
+                'is_returned': returned_at is not None,
+                'borrowed_at': borrowed_at,
+                'returned_at': returned_at,
+            }
+            for asset_id, quantity, borrowed_at, returned_at in loans
+        ])
+    return database
+
+def test_loan_history_utilization():
+    database = setup()
+    history = LoanHistory.load(
+        database, since=date(2020, 1, 1), until=date(2020, 1, 11))
+
+    assert(len(history.quantity) == 4)
+    assert(history.utilization() == [
+        Utilization('Eraser', 0, None, 0, None),
+        Utilization('Marker', 5, 0.1, 5, timedelta(days=3)),
+        Utilization('Pen', 10, 0.21, 5, timedelta(days=3)),
+    ])
+
+def test_loan_history_occupancy():
+    database = setup()
+    history = LoanHistory.load(
+        database, since=date(2020, 1, 1), until=date(2020, 1, 11))
+
+    times, units = history.occupancy('Pen')
+    assert(list(times) == [np.datetime64(day(n)) for n in (0, 1, 2, 5, 10)])
+    assert(list(units) == [2, 5, 3, 1, 0])
+    times, units = history.occupancy('Eraser')
+    assert(len(times) == 0 and len(units) == 0)
+    with pytest.raises(KeyError):
+        history.occupancy('Pencil')
+
+def test_loan_history_default_window():
+    database = setup()
+    history = LoanHistory.load(database, until=date(2020, 1, 11))
+
+    assert(history.since == history.start.min())
+    assert([u.peak for u in history.utilization()] == [0, 5, 5])
+    history = LoanHistory.load(database, since=date(2021, 1, 1))
+    assert(len(history.quantity) == 1)
+    assert([u.peak for u in history.utilization()] == [0, 0, 1])
+
+def test_availability_calendar():
+    database = setup()
+    model = Model(database)
+    today = date.today()
+    model.borrow_asset('Amy', 'Pen', 2, today + timedelta(days=1))
+    model.borrow_asset('Amy', 'Pen', 1, today + timedelta(days=3))
+    model.borrow_asset('Amy', 'Marker', 4, today + timedelta(days=30))
+
+    calendar = get_availability_calendar(database, days=7)
+    assert(calendar.names == ['Eraser', 'Marker', 'Pen'])
+    assert(calendar.dates == [today + timedelta(days=i) for i in range(7)])
+    for name, row in zip(calendar.names, calendar.instock):
+        assert([(day, int(instock))
+            for day, instock in zip(calendar.dates, row)]
+            == model.get_availability_forecast(name, days=7))
+
+def test_loan_history_include_archived():
+    database = setup()
+    window = {'since': date(2020, 1, 1), 'until': date(2020, 1, 11)}
+    utilization = LoanHistory.load(database, **window).utilization()
+
+    assert(Model(database).archive_loans() == 3)
+    assert(len(LoanHistory.load(database, **window).quantity) == 1)
+    history = LoanHistory.load(database, include_archived=True, **window)
+    assert(history.utilization() == utilization)
@@ -1,9 +1,12 @@
+import sqlite3
 from datetime import datetime
 
 import pytest
 from sqlalchemy.exc import IntegrityError
 
-from assetmanagement.src.database import Asset, Borrower, Database, Loan
+from assetmanagement.src.database import (SCHEMA_VERSION, Asset,
+                                          AssetLedger, Base, Borrower,
+                                          Database, Loan, Outstanding)
 
 ENGINE = 'sqlite:///:memory:'
 
@@ -289,3 +292,142 @@ def test_database_get_session():
 
     with database.get_session() as session:
         assert(session.query(Borrower).count() == 1)
+
+def get_pragma(database, name):
+    with database.engine.connect() as connection:
+        return connection.execute('PRAGMA {}'.format(name)).scalar()
+
+def test_database_profile_fast(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine, profile='fast')
+
+    assert(get_pragma(database, 'journal_mode') == 'wal')
+    assert(get_pragma(database, 'synchronous') == 1)
+    assert(get_pragma(database, 'temp_store') == 2)
+    assert(get_pragma(database, 'busy_timeout') == 5000)
+
+def test_database_profile_durable(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine, profile='durable')
+
+    assert(get_pragma(database, 'journal_mode') == 'delete')
+    assert(get_pragma(database, 'synchronous') == 2)
+
+def test_database_profile_custom():
+    database = Database(ENGINE, profile={'cache_size': -4000})
+
+    assert(get_pragma(database, 'cache_size') == -4000)
+
+def test_database_profile_invalid():
+    with pytest.raises(ValueError):
+        Database(ENGINE, profile='reckless')
+    with pytest.raises(ValueError):
+        Database(ENGINE, profile={'cache_size': '1; DROP TABLE loan'})
+
+LEGACY_SCHEMA = [
+    '''CREATE TABLE borrower (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL,
+        is_active BOOLEAN NOT NULL, PRIMARY KEY (id))''',
+    'CREATE UNIQUE INDEX ix_borrower_name ON borrower (name)',
+    '''CREATE TABLE asset (
+        id INTEGER NOT NULL, name VARCHAR NOT NULL,
+        total INTEGER NOT NULL, instock INTEGER NOT NULL, PRIMARY KEY (id))''',
+    'CREATE UNIQUE INDEX ix_asset_name ON asset (name)',
+    '''CREATE TABLE loan (
+        id INTEGER NOT NULL, borrower_id INTEGER NOT NULL,
+        asset_id INTEGER NOT NULL, quantity INTEGER NOT NULL,
+        datedue DATE NOT NULL, is_returned BOOLEAN NOT NULL,
+        PRIMARY KEY (id))''',
+    '''CREATE TABLE passcode (
+        id INTEGER NOT NULL, salt VARCHAR(32) NOT NULL,
+        "key" VARCHAR(128) NOT NULL, PRIMARY KEY (id))''',
+    "INSERT INTO borrower VALUES (1, 'Amy', 1)",
+    "INSERT INTO asset VALUES (1, 'Pen', 10, 7)",
+    "INSERT INTO loan VALUES (1, 1, 1, 3, '2020-01-01', 0)",
+]
+
+def get_index_names(database, table):
+    with database.engine.connect() as connection:
+        rows = connection.execute('PRAGMA index_list({})'.format(table))
+        return {row[1] for row in rows}
+
+def test_database_fresh_schema_version(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine)
+
+    with database.engine.connect() as connection:
+        version = connection.execute(
+            'SELECT version FROM schema_version').scalar()
+    assert(version == SCHEMA_VERSION)
+    assert('ix_loan_borrower_asset_returned' in get_index_names(
+        database, 'loan'))
+
+def test_database_upgrade_legacy(tmp_path):
+    path = tmp_path / 'equipmentmanagement.db'
+    connection = sqlite3.connect(str(path))
+    for statement in LEGACY_SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+    database = Database('sqlite:///' + str(path))
+
+    with database.engine.connect() as connection:
+        version = connection.execute(
+            'SELECT version FROM schema_version').scalar()
+    assert(version == SCHEMA_VERSION)
+    indexes = get_index_names(database, 'loan')
+    assert('ix_loan_borrower_asset_returned' in indexes)
+    assert('ix_loan_returned_datedue' in indexes)
+    assert('ix_loan_borrowed_at' in indexes)
+    assert('ix_loan_asset_returned_datedue' in indexes)
+    assert('ix_reservation_asset_dateto' in get_index_names(
+        database, 'reservation'))
+    assert('ix_loan_archive_borrowed_at' in get_index_names(
+        database, 'loan_archive'))
+    with database.get_session() as session:
+        loan = session.query(Loan).one()
+        assert(loan.borrower.name == 'Amy')
+        assert(loan.asset.instock == 7)
+        assert(loan.borrowed_at is None and loan.returned_at is None)
+        outstanding = session.query(Outstanding).one()
+        assert(repr(outstanding) ==
+            '<Outstanding(borrower_id: 1, asset_id: 1, quantity: 3)>')
+        ledger = session.query(AssetLedger).one()
+        assert((ledger.asset_id, ledger.total_delta, ledger.instock_delta)
+            == (1, 10, 7))
+    with database.engine.connect() as connection:
+        rowids = connection.execute(
+            "SELECT rowid FROM borrower_fts WHERE borrower_fts MATCH 'am*'")
+        assert([rowid for (rowid,) in rowids] == [1])
+    assert(database.name_search)
+
+def test_database_current_skips_create_all(tmp_path, monkeypatch):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    Database(engine).engine.dispose()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('create_all should not run')
+    monkeypatch.setattr(Base.metadata, 'create_all', fail)
+
+    Database(engine)
+
+def test_database_newer_schema(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine)
+    with database.engine.connect() as connection:
+        connection.execute(
+            'UPDATE schema_version SET version = version + 1')
+    database.engine.dispose()
+
+    with pytest.raises(RuntimeError):
+        Database(engine)
+
+def test_database_loan_borrowed_at_range_scan():
+    database = Database('sqlite:///:memory:')
+    with database.engine.connect() as connection:
+        plan = connection.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM loan '
+            "WHERE borrowed_at >= '2020-01-01' AND borrowed_at < '2020-02-01'"
+        ).fetchall()
+    assert('ix_loan_borrowed_at' in ' '.join(row[-1] for row in plan))
@@ -1,12 +1,24 @@
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 
 import pytest
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
-from assetmanagement.src.database import (Asset, Borrower, Database, Loan,
-                                          Passcode)
-from assetmanagement.src.model import Model, ModelError
+from assetmanagement.src.database import (LEDGER_SNAPSHOT_INTERVAL, Asset,
+                                          AssetLedger, Borrower, Database,
+                                          LedgerSnapshot, Loan, LoanArchive,
+                                          Outstanding, Passcode)
+from assetmanagement.src.inventory import Inventory
+from assetmanagement.src.model import Change, Model, ModelError
+from assetmanagement.src.observable import (NotificationDispatcher,
+                                            dispatch_notifications,
+                                            wait_for_notifications)
 
 ENGINE = 'sqlite:///:memory:'
 
@@ -697,6 +709,63 @@ def test_get_loans():
     loans_pen_overdue = model.get_loans(asset_name='Pen', overdue_only=True)
     assert(len(loans_pen_overdue) == 1)
 
+def test_get_loans_variants():
+    # Cached variants must take names and dates as parameters, not reuse
+    # the values of the call that compiled them.
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+    loans_all = model.get_loans()
+    for borrower_name in (None, 'Amy', 'Cindy', 'Nobody'):
+        for asset_name in (None, 'Pen', 'Marker'):
+            for active_only in (False, True):
+                for overdue_only in (False, True):
+                    expected = [
+                        loan for loan in loans_all
+                        if borrower_name in (None, loan[0])
+                        and asset_name in (None, loan[1])
+                        and not ((active_only or overdue_only) and loan[4])
+                        and not (overdue_only and loan[3] >= date.today())
+                    ]
+                    loans = model.get_loans(
+                        borrower_name, asset_name, active_only, overdue_only)
+                    assert sorted(loans) == sorted(expected)
+
+def test_get_outstanding():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+    assert(model.get_outstanding(by='asset') == [('Marker', 3), ('Pen', 9)])
+    assert(model.get_outstanding(by='borrower')
+        == [('Amy', 3), ('Bob', 4), ('Cindy', 5)])
+    assert(model.get_outstanding() == [
+        ('Amy', 'Pen', 3),
+        ('Bob', 'Marker', 2),
+        ('Bob', 'Pen', 2),
+        ('Cindy', 'Marker', 1),
+        ('Cindy', 'Pen', 4),
+    ])
+    assert(model.get_outstanding(by='borrower', asset_name='Marker')
+        == [('Bob', 2), ('Cindy', 1)])
+    assert(model.get_outstanding(by='asset', borrower_name='Amy')
+        == [('Pen', 3)])
+    assert(model.get_outstanding(by='asset', borrower_name='Nobody') == [])
+    with pytest.raises(ValueError):
+        model.get_outstanding(by='date')
+
+def test_get_overdue_summary():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+    assert(model.get_overdue_summary() == [('Bob', 2, 4)])
+    assert(model.get_overdue_summary(by='asset')
+        == [('Marker', 1, 2), ('Pen', 1, 2)])
+    assert(model.get_overdue_summary(by='both', asset_name='Pen')
+        == [('Bob', 'Pen', 1, 2)])
+    assert(model.get_overdue_summary(borrower_name='Cindy') == [])
+    with pytest.raises(ValueError):
+        model.get_overdue_summary(by='date')
+
 def test_deactivate_active_loan_borrower():
     _, model = setup()
     model.add_borrower(name='Amy')
@@ -732,3 +801,1249 @@ def test_deactivate_inactive_loan_borrower():
             .one()
         )
         assert(is_active == (False,))
+
+def write_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+def test_import_borrowers(tmp_path):
+    database, model = setup()
+    model.add_borrower(name='Amy')
+    model.deactivate_borrower(name='Amy')
+    calls = []
+    model.import_borrowers.add_observer(
+        lambda: calls.append(1), pass_arguments=False)
+
+    path = write_file(tmp_path, 'borrowers.csv', 'name\nAmy\nBob\nBob\n美\n')
+    result = model.import_borrowers(path)
+
+    assert(result.imported == 4)
+    assert(result.errors == [])
+    assert(model.get_borrower_names(active_only=True) == ['Amy', 'Bob', '美'])
+    assert(len(calls) == 1)
+
+def test_import_borrowers_jsonl_errors(tmp_path):
+    _, model = setup()
+
+    path = write_file(
+        tmp_path,
+        'borrowers.jsonl',
+        '{"name": "Amy"}\n{"nome": "Bob"}\nnot json\n\n{"name": "Cindy"}\n'
+    )
+    result = model.import_borrowers(path)
+
+    assert(result.imported == 2)
+    assert([row for row, _ in result.errors] == [2, 3])
+    assert(model.get_borrower_names() == ['Amy', 'Cindy'])
+
+def test_import_assets(tmp_path):
+    _, model = setup()
+    model.add_asset(name='Pen', quantity=10)
+
+    path = write_file(
+        tmp_path,
+        'assets.csv',
+        'name,quantity\nPen,5\nMarker,3\nMarker,2\nEraser,-1\nRuler,x\n'
+    )
+    result = model.import_assets(path)
+
+    assert(result.imported == 3)
+    assert(result.errors == [
+        (4, 'quantity must be non negative'),
+        (5, 'quantity must be an integer'),
+    ])
+    assert(model.get_assets() == [('Marker', 5, 5), ('Pen', 15, 15)])
+
+def test_import_loans(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+
+    path = write_file(
+        tmp_path,
+        'loans.csv',
+        'borrower,asset,quantity,datedue,is_returned\n'
+        'Amy,Pen,3,{0},\n'
+        'Bob,Pen,8,{0},\n'
+        'Bob,Pen,8,{0},yes\n'
+        'Dio,Pen,1,{0},\n'
+        'Amy,Pencil,1,{0},\n'
+        'Cindy,Marker,1,tomorrow,\n'.format(NEXT_DAY.isoformat())
+    )
+    result = model.import_loans(path)
+
+    assert(result.imported == 2)
+    assert(result.errors == [
+        (2, 'not enough instock'),
+        (4, 'unknown borrower'),
+        (5, 'unknown asset'),
+        (6, 'datedue must be a YYYY-MM-DD date'),
+    ])
+    assert(model.get_asset('Pen') == ('Pen', 10, 7))
+    assert(model.get_loans() == [
+        ('Amy', 'Pen', 3, NEXT_DAY, False),
+        ('Bob', 'Pen', 8, NEXT_DAY, True),
+    ])
+
+def test_import_loans_reserved(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+    day = lambda n: TODAY + timedelta(days=n)
+    model.reserve('Cindy', 'Marker', 5, day(2), day(2))
+
+    path = write_file(
+        tmp_path,
+        'loans.csv',
+        'borrower,asset,quantity,datedue,is_returned\n'
+        'Amy,Pen,3,{0},\n'
+        'Bob,Marker,5,{0},\n'.format(day(12).isoformat())
+    )
+    with pytest.raises(IntegrityError):
+        model.import_loans(path)
+
+    assert(model.get_loans() == [])
+    assert(model.get_asset('Pen') == ('Pen', 10, 10))
+    assert(model.get_asset('Marker') == ('Marker', 5, 5))
+    assert(len(model.get_reservations()) == 1)
+
+def test_import_unknown_format(tmp_path):
+    _, model = setup()
+
+    path = write_file(tmp_path, 'borrowers.txt', 'name\nAmy\n')
+    with pytest.raises(ValueError):
+        model.import_borrowers(path)
+
+def test_iter_loans():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+
+    assert(list(model.iter_loans(chunk_size=2)) == model.get_loans())
+    assert(list(model.iter_loans(asset_name='Pen', overdue_only=True))
+        == model.get_loans(asset_name='Pen', overdue_only=True))
+
+def test_export_loans_round_trip(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+
+    for format in ('csv', 'jsonl'):
+        path = str(tmp_path / ('loans.' + format))
+        assert(model.export_loans(path, format=format) == 6)
+
+        another_database, another_model = setup()
+        setup_for_loan(another_database)
+        result = another_model.import_loans(path)
+        assert(result.errors == [])
+        assert(another_model.get_loans() == model.get_loans())
+        assert(another_model.get_assets() == model.get_assets())
+
+def export_peak_memory(tmp_path, count):
+    database, model = setup()
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=1)
+    loan = {
+        'borrower_id': 1,
+        'asset_id': 1,
+        'quantity': 1,
+        'datedue': PREV_DAY,
+        'is_returned': True,
+    }
+    with database.get_session() as session:
+        session.execute(Loan.__table__.insert(), [loan] * count)
+
+    tracemalloc.start()
+    try:
+        written = model.export_loans(str(tmp_path / 'loans.csv'))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert(written == count)
+    return peak
+
+def test_export_loans_constant_memory(tmp_path):
+    # benchmarks/bench_export.py compares 10k against 1M loans by RSS
+    small = export_peak_memory(tmp_path, 5000)
+    large = export_peak_memory(tmp_path, 50000)
+    assert(large < small * 1.5)
+
+def get_outstanding_rows(database):
+    with database.get_session() as session:
+        rows = (
+            session.query(
+                Outstanding.borrower_id,
+                Outstanding.asset_id,
+                Outstanding.quantity
+            )
+            .order_by(Outstanding.borrower_id, Outstanding.asset_id)
+            .all()
+        )
+    return rows
+
+def test_outstanding():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+
+    assert(get_outstanding_rows(database) == [(1, 1, 8), (1, 2, 1), (2, 2, 2)])
+    assert(model.get_outstanding_assets('Amy') == [('Marker', 1), ('Pen', 8)])
+
+    model.return_asset(borrower_name='Amy', asset_name='Pen')
+
+    assert(get_outstanding_rows(database) == [(1, 2, 1), (2, 2, 2)])
+    assert(model.get_outstanding_assets('Amy') == [('Marker', 1)])
+    assert(model.get_outstanding_assets('Cindy') == [])
+
+def test_outstanding_borrow_not_enough():
+    database, model = setup()
+    setup_for_loan(database)
+
+    with pytest.raises(IntegrityError):
+        model.borrow_asset(
+            borrower_name='Amy',
+            asset_name='Pen',
+            quantity=11,
+            datedue=NEXT_DAY
+        )
+
+    assert(get_outstanding_rows(database) == [])
+
+def test_outstanding_import_loans(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+
+    path = write_file(
+        tmp_path,
+        'loans.csv',
+        'borrower,asset,quantity,datedue,is_returned\n'
+        'Amy,Pen,3,{0},\n'
+        'Amy,Pen,2,{0},\n'
+        'Bob,Pen,4,{0},true\n'.format(NEXT_DAY.isoformat())
+    )
+    model.import_loans(path)
+
+    assert(get_outstanding_rows(database) == [(1, 1, 6)])
+
+def drift_outstanding(database):
+    # Amy has 8 Pen and 1 Marker out
+    with database.get_session() as session:
+        session.query(Outstanding) \
+            .filter_by(borrower_id=1, asset_id=1) \
+            .update({'quantity': 1})
+        session.query(Outstanding) \
+            .filter_by(borrower_id=1, asset_id=2) \
+            .delete()
+
+def test_outstanding_drift_return_asset():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+    drift_outstanding(database)
+
+    model.return_asset('Amy', 'Pen')
+    model.return_asset('Amy', 'Marker')
+
+    assert(model.get_assets() == [('Marker', 5, 3), ('Pen', 10, 10)])
+    assert(get_outstanding_rows(database) == [(2, 2, 2)])
+    with pytest.raises(NoResultFound):
+        model.return_asset('Amy', 'Pen')
+
+def test_outstanding_drift_return_assets():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+    drift_outstanding(database)
+
+    model.return_assets('Amy', ['Pen', 'Marker'])
+
+    assert(model.get_assets() == [('Marker', 5, 3), ('Pen', 10, 10)])
+    assert(get_outstanding_rows(database) == [(2, 2, 2)])
+    with pytest.raises(NoResultFound):
+        model.return_assets('Amy', ['Pen'])
+
+def test_rebuild_outstanding():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+    expected = get_outstanding_rows(database)
+
+    with database.get_session() as session:
+        session.query(Outstanding).delete()
+        session.add(Outstanding(borrower_id=2, asset_id=1, quantity=99))
+    model.rebuild_outstanding()
+
+    assert(get_outstanding_rows(database) == expected)
+    assert(expected == [(1, 1, 3), (2, 1, 2), (2, 2, 2), (3, 1, 4), (3, 2, 1)])
+
+def count_commits(database):
+    commits = []
+    event.listen(database.engine, 'commit', lambda conn: commits.append(1))
+    return commits
+
+def test_batch():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+    commits = count_commits(database)
+    calls = []
+    model.return_asset.add_observer(
+        lambda borrower_name, asset_name: calls.append(
+            (borrower_name, asset_name, len(commits))))
+
+    with model.batch():
+        model.return_asset('Amy', 'Pen')
+        model.return_asset('Amy', 'Marker')
+        assert(calls == [])
+        assert(model.get_outstanding_assets('Amy') == [])
+
+    assert(len(commits) == 1)
+    assert(calls == [('Amy', 'Pen', 1), ('Amy', 'Marker', 1)])
+    assert(model.get_assets() == [('Marker', 5, 3), ('Pen', 10, 10)])
+
+def test_batch_rollback():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+    calls = []
+    model.return_asset.add_observer(
+        lambda: calls.append(1), pass_arguments=False)
+
+    with pytest.raises(NoResultFound):
+        with model.batch():
+            model.return_asset('Amy', 'Pen')
+            model.return_asset('Cindy', 'Pen')
+
+    assert(calls == [])
+    assert(model.get_outstanding_assets('Amy') == [('Marker', 1), ('Pen', 8)])
+    assert(model.get_asset('Pen') == ('Pen', 10, 2))
+
+    model.return_asset('Amy', 'Pen')
+    assert(calls == [1])
+
+def test_batch_rollback_other_thread(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    model = Model(Database(engine))
+    calls = []
+    model.add_asset.add_observer(
+        lambda name, quantity: calls.append(name))
+    started = threading.Event()
+    added = threading.Event()
+
+    def add_cup():
+        started.wait()
+        model.add_asset(name='Cup', quantity=1)
+        added.set()
+
+    thread = threading.Thread(target=add_cup)
+    thread.start()
+    with pytest.raises(ValueError):
+        with model.batch():
+            started.set()
+            assert(added.wait(10))
+            model.add_asset(name='Pen', quantity=10)
+            raise ValueError
+    thread.join()
+
+    # the other thread's call committed, so its observers heard of it
+    assert(calls == ['Cup'])
+    assert(model.get_assets() == [('Cup', 1, 1)])
+
+def test_observers_on_dispatcher_thread(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine)
+    model = Model(database, name_cache_size=1)
+    setup_for_loan(database)
+    dispatcher = NotificationDispatcher()
+    dispatch_notifications(model, dispatcher)
+    reads = []
+
+    def read():
+        reads.append((
+            model.get_asset('Pen'),
+            model.get_outstanding_assets('Amy'),
+            model.search_assets('Pe'),
+        ))
+
+    model.borrow_asset.add_observer(read, pass_arguments=False)
+    model.return_asset.add_observer(read, pass_arguments=False)
+    for _ in range(50):
+        model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+        model.borrow_asset('Bob', 'Marker', 1, NEXT_DAY)
+        # rolls back, clearing the caches the observers are reading
+        with pytest.raises(IntegrityError):
+            model.reserve('Bob', 'Pen', 11, TODAY, NEXT_DAY)
+        model.return_asset('Amy', 'Pen')
+        model.return_asset('Bob', 'Marker')
+    assert(wait_for_notifications(model, timeout=10))
+    dispatcher.shutdown()
+
+    assert(dispatcher.failed == 0)
+    assert(len(reads) == 200)
+
+def test_batch_nested_mixed_writes(tmp_path):
+    database, model = setup()
+    path = write_file(tmp_path, 'assets.csv', 'name,quantity\nPen,5\n')
+    commits = count_commits(database)
+
+    with model.batch():
+        model.add_borrower(name='Amy')
+        model.add_asset(name='Pen', quantity=10)
+        with model.batch():
+            model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+        model.import_assets(path)
+        model.borrow_asset('Amy', 'Pen', 2, NEXT_DAY)
+
+    assert(len(commits) == 1)
+    assert(model.get_asset('Pen') == ('Pen', 15, 10))
+    assert(model.get_outstanding_assets('Amy') == [('Pen', 5)])
+
+def observe_changes(model, *methods):
+    changes = []
+    observer = lambda published: changes.extend(published)
+    for method in methods:
+        getattr(model, method).add_observer(
+            observer, pass_arguments=False, pass_changes=True)
+    return changes
+
+def test_changes():
+    database, model = setup()
+    changes = observe_changes(
+        model, 'add_borrower', 'deactivate_borrower', 'add_asset',
+        'remove_asset', 'borrow_asset', 'return_asset', 'borrow_assets',
+        'return_assets')
+
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    model.add_asset(name='Pen', quantity=2)
+    model.add_asset(name='Marker', quantity=5)
+    assert(changes == [
+        Change('borrower', 'Amy', None, True),
+        Change('asset', 'Pen', None, (10, 10)),
+        Change('asset', 'Pen', (10, 10), (12, 12)),
+        Change('asset', 'Marker', None, (5, 5)),
+    ])
+
+    del changes[:]
+    model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.return_asset('Amy', 'Pen')
+    assert(changes == [
+        Change('loan', 1, None, False),
+        Change('asset', 'Pen', (12, 12), (12, 9)),
+        Change('loan', 2, None, False),
+        Change('asset', 'Pen', (12, 9), (12, 8)),
+        Change('loan', 1, False, True),
+        Change('loan', 2, False, True),
+        Change('asset', 'Pen', (12, 8), (12, 12)),
+    ])
+
+    del changes[:]
+    model.borrow_assets('Amy', [('Pen', 2), ('Marker', 5)], NEXT_DAY)
+    assert(sorted(changes) == [
+        Change('asset', 'Marker', (5, 5), (5, 0)),
+        Change('asset', 'Pen', (12, 12), (12, 10)),
+        Change('loan', 3, None, False),
+        Change('loan', 4, None, False),
+    ])
+    assert(sorted(
+        loan_id for entity, loan_id, _, _ in changes if entity == 'loan'
+    ) == [3, 4])
+
+    del changes[:]
+    model.return_assets('Amy', ['Pen', 'Marker'])
+    model.remove_asset('Marker')
+    model.deactivate_borrower('Amy')
+    model.deactivate_borrower('Amy')
+    assert(sorted(changes[:4]) == [
+        Change('asset', 'Marker', (5, 0), (5, 5)),
+        Change('asset', 'Pen', (12, 10), (12, 12)),
+        Change('loan', 3, False, True),
+        Change('loan', 4, False, True),
+    ])
+    assert(changes[4:] == [
+        Change('asset', 'Marker', (5, 5), (0, 0)),
+        Change('borrower', 'Amy', True, False),
+    ])
+
+def test_changes_bulk(tmp_path):
+    database, model = setup()
+    changes = observe_changes(model, 'import_assets', 'archive_loans')
+    path = write_file(tmp_path, 'assets.csv', 'name,quantity\nPen,5\n')
+
+    model.import_assets(path)
+    assert(model.archive_loans() == 0)
+
+    assert(changes == [Change('asset', None, None, None)])
+
+def test_changes_batch():
+    database, model = setup()
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    changes = observe_changes(model, 'borrow_asset', 'return_asset')
+    calls = []
+    count = lambda published: calls.append(len(published))
+    model.borrow_asset.add_observer(
+        count, pass_arguments=False, pass_changes=True)
+    model.return_asset.add_observer(
+        count, pass_arguments=False, pass_changes=True)
+
+    with model.batch():
+        model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+        model.return_asset('Amy', 'Pen')
+        assert(changes == [])
+
+    assert(changes == [
+        Change('loan', 1, None, False),
+        Change('asset', 'Pen', (10, 10), (10, 7)),
+        Change('loan', 1, False, True),
+        Change('asset', 'Pen', (10, 7), (10, 10)),
+    ])
+    # every change in one call
+    assert(calls == [4])
+
+def test_borrow_assets():
+    database, model = setup()
+    setup_for_loan(database)
+    calls = []
+    model.borrow_assets.add_observer(
+        lambda: calls.append(1), pass_arguments=False)
+
+    model.borrow_assets(
+        borrower_name='Amy',
+        items=[('Pen', 2), ('Marker', 5), ('Pen', 3)],
+        datedue=NEXT_DAY
+    )
+
+    assert(calls == [1])
+    assert(model.get_assets() == [('Marker', 5, 0), ('Pen', 10, 5)])
+    assert(sorted(model.get_loans()) == [
+        ('Amy', 'Marker', 5, NEXT_DAY, False),
+        ('Amy', 'Pen', 5, NEXT_DAY, False),
+    ])
+    assert(model.get_outstanding_assets('Amy') == [('Marker', 5), ('Pen', 5)])
+
+def test_borrow_assets_atomic():
+    database, model = setup()
+    setup_for_loan(database)
+
+    with pytest.raises(ValueError):
+        model.borrow_assets('Amy', [], NEXT_DAY)
+    with pytest.raises(ValueError):
+        model.borrow_assets('Amy', [('Pen', 1), ('Marker', 0)], NEXT_DAY)
+    with pytest.raises(NoResultFound):
+        model.borrow_assets('Dio', [('Pen', 1)], NEXT_DAY)
+    with pytest.raises(NoResultFound):
+        model.borrow_assets('Amy', [('Pen', 1), ('Pencil', 1)], NEXT_DAY)
+    with pytest.raises(IntegrityError):
+        model.borrow_assets('Amy', [('Pen', 1), ('Marker', 6)], NEXT_DAY)
+
+    assert(model.get_assets() == [('Marker', 5, 5), ('Pen', 10, 10)])
+    assert(model.get_loans() == [])
+    assert(get_outstanding_rows(database) == [])
+
+def test_return_assets():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+
+    model.return_assets(borrower_name='Amy', asset_names=['Pen', 'Marker'])
+
+    assert(model.get_assets() == [('Marker', 5, 3), ('Pen', 10, 10)])
+    assert(model.get_loans(active_only=True) == [
+        ('Bob', 'Marker', 2, NEXT_DAY, False),
+    ])
+    assert(get_outstanding_rows(database) == [(2, 2, 2)])
+
+def test_return_assets_atomic():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_for_return(model)
+
+    with pytest.raises(ValueError):
+        model.return_assets('Amy', [])
+    with pytest.raises(NoResultFound):
+        model.return_assets('Dio', ['Pen'])
+    with pytest.raises(NoResultFound):
+        model.return_assets('Amy', ['Pen', 'Pencil'])
+    with pytest.raises(NoResultFound):
+        model.return_assets('Bob', ['Marker', 'Pen'])
+
+    assert(model.get_assets() == [('Marker', 5, 2), ('Pen', 10, 2)])
+    assert(len(model.get_loans(active_only=True)) == 4)
+
+def test_name_cache():
+    database, model = setup()
+    setup_for_loan(database)
+
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    assert((model.borrower_ids.hits, model.borrower_ids.misses) == (0, 1))
+    assert((model.asset_ids.hits, model.asset_ids.misses) == (0, 1))
+
+    model.return_asset('Amy', 'Pen')
+    model.borrow_assets('Amy', [('Pen', 1), ('Marker', 1)], NEXT_DAY)
+    model.return_assets('Amy', ['Pen', 'Marker'])
+    model.deactivate_borrower('Amy')
+    assert((model.borrower_ids.hits, model.borrower_ids.misses) == (4, 1))
+    assert((model.asset_ids.hits, model.asset_ids.misses) == (4, 2))
+
+def test_name_cache_bounded():
+    database, model = setup()
+    model = Model(database, name_cache_size=1)
+    setup_for_loan(database)
+
+    model.modify_asset_instock('Pen', -1)
+    model.modify_asset_instock('Marker', -1)
+    model.modify_asset_instock('Pen', -1)
+
+    assert(len(model.asset_ids) == 1)
+    assert((model.asset_ids.hits, model.asset_ids.misses) == (0, 3))
+    assert(model.get_assets() == [('Marker', 5, 4), ('Pen', 10, 8)])
+
+def test_name_cache_rollback():
+    database, model = setup()
+    setup_for_loan(database)
+
+    with pytest.raises(IntegrityError):
+        with model.batch():
+            model.add_borrower(name='Dio')
+            model.borrow_asset('Dio', 'Pen', 1, NEXT_DAY)
+            model.add_borrower(name='Amy')
+    model.add_borrower(name='Eve')
+
+    with pytest.raises(NoResultFound):
+        model.borrow_asset('Dio', 'Pen', 1, NEXT_DAY)
+    model.borrow_asset('Eve', 'Pen', 1, NEXT_DAY)
+    assert(model.get_loans() == [('Eve', 'Pen', 1, NEXT_DAY, False)])
+
+def test_name_cache_other_process(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    model = Model(Database(engine))
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.return_asset('Amy', 'Pen')
+
+    other = Database(engine)
+    with other.get_session() as session:
+        session.query(Loan).delete()
+        session.query(Borrower).delete()
+        session.add(Borrower(id=1, name='Bob'))
+
+    with pytest.raises(NoResultFound):
+        model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.borrow_asset('Bob', 'Pen', 1, NEXT_DAY)
+    assert(model.get_loans() == [('Bob', 'Pen', 1, NEXT_DAY, False)])
+
+def test_borrow_asset_concurrent(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    model = Model(Database(engine))
+    for name in ('Amy', 'Bob', 'Cindy', 'David'):
+        model.add_borrower(name=name)
+    model.add_asset(name='Pen', quantity=50)
+
+    def borrow(name):
+        other = Model(Database(engine))
+        while True:
+            try:
+                other.borrow_asset(name, 'Pen', 1, NEXT_DAY)
+            except IntegrityError:
+                return
+
+    threads = [
+        threading.Thread(target=borrow, args=(name,))
+        for name in ('Amy', 'Bob', 'Cindy', 'David')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert(model.get_asset('Pen') == ('Pen', 50, 0))
+    assert(sum(loan[2] for loan in model.get_loans()) == 50)
+
+def test_return_asset_statements():
+    database, model = setup()
+    model.add_borrower(name='Amy')
+    model.add_asset(name='Pen', quantity=10)
+    model.borrow_asset('Amy', 'Pen', 2, NEXT_DAY)
+    model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+
+    statements = []
+    event.listen(
+        database.engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2])
+    )
+    model.return_asset('Amy', 'Pen')
+    # one sum over the open loans, no loan rows
+    loan_reads = [s for s in statements if s.startswith('SELECT loan')]
+    assert(len(loan_reads) == 1 and 'sum(loan.quantity)' in loan_reads[0])
+    assert(model.get_asset('Pen') == ('Pen', 10, 10))
+    assert(model.get_outstanding_assets('Amy') == [])
+
+def test_get_loans_page():
+    database, model = setup()
+    setup_for_loan(database)
+    setup_pre_borrow_return(model)
+    for active_only in (False, True):
+        expected = model.get_loans(active_only=active_only)
+        page = model.get_loans_page(
+            active_only=active_only, limit=2, count=True)
+        assert(page.total == len(expected))
+        loans = page.loans
+        while page.cursor is not None:
+            page = model.get_loans_page(
+                active_only=active_only, after=page.cursor, limit=2)
+            assert(page.total is None)
+            assert(0 < len(page.loans) <= 2)
+            loans += page.loans
+        assert(loans == expected)
+
+def test_get_loans_page_insert_between_pages():
+    database, model = setup()
+    setup_for_loan(database)
+    first = model.get_loans_page(limit=1)
+    assert(first.loans == [] and first.cursor is None)
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.borrow_asset('Amy', 'Pen', 2, NEXT_DAY)
+    first = model.get_loans_page(limit=1)
+    model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+    second = model.get_loans_page(after=first.cursor, limit=1)
+    third = model.get_loans_page(after=second.cursor, limit=1)
+    assert([loan[2] for loan in first.loans + second.loans + third.loans]
+        == [1, 2, 3])
+    assert(third.cursor is None)
+
+def setup_for_search(model):
+    for name in ('Amy Adams', 'adam smith', 'Bob Brown', 'O"Neil', '50%'):
+        model.add_borrower(name=name)
+    model.add_asset(name='Pen blue', quantity=2)
+    model.add_asset(name='Pen red', quantity=1)
+    model.add_asset(name='Pencil', quantity=1)
+
+def test_search_borrowers():
+    _, model = setup()
+    setup_for_search(model)
+    assert(model.search_borrowers('ad') == ['Amy Adams', 'adam smith'])
+    assert(model.search_borrowers('SM') == ['adam smith'])
+    assert(model.search_borrowers('a a') == ['Amy Adams', 'adam smith'])
+    assert(model.search_borrowers('ada smi') == ['adam smith'])
+    assert(model.search_borrowers('o"n') == ['O"Neil'])
+    assert(model.search_borrowers('%') == [])
+    assert(model.search_borrowers('dam') == [])
+    assert(model.search_borrowers('', limit=2) == ['50%', 'Amy Adams'])
+    model.deactivate_borrower(name='Amy Adams')
+    assert(model.search_borrowers('ad', active_only=True) == ['adam smith'])
+    assert(model.search_borrowers('ad') == ['Amy Adams', 'adam smith'])
+
+def test_search_assets():
+    _, model = setup()
+    setup_for_search(model)
+    model.add_borrower(name='Amy')
+    model.borrow_asset('Amy', 'Pen red', 1, NEXT_DAY)
+    model.remove_asset(name='Pencil')
+    assert(model.search_assets('pen') == ['Pen blue', 'Pen red', 'Pencil'])
+    assert(model.search_assets('pen', active_only=True)
+        == ['Pen blue', 'Pen red'])
+    assert(model.search_assets('pen', instock_only=True) == ['Pen blue'])
+    assert(model.search_assets('pen r') == ['Pen red'])
+
+def test_search_exact_match():
+    _, model = setup()
+    for i in range(60):
+        model.add_borrower(name='Ann{:02} Lee'.format(i))
+    model.add_borrower(name='Lee')
+
+    names = model.search_borrowers('Lee')
+    assert(len(names) == 50)
+    assert(names[:3] == ['Lee', 'Ann00 Lee', 'Ann01 Lee'])
+    assert(model.search_borrowers('Lee ', limit=2) == ['Lee', 'Ann00 Lee'])
+    assert('Lee' not in model.search_borrowers('Le'))
+    model.deactivate_borrower(name='Lee')
+    assert('Lee' not in model.search_borrowers('Lee', active_only=True))
+
+def test_search_punctuated_names():
+    _, model = setup()
+    for name in ["Conan O'Brien", 'Anne-Marie Roux', 'Élodie Faure', 'Zed']:
+        model.add_borrower(name=name)
+
+    # found the same from the first letter on
+    for typed, name in [
+            ('b', "Conan O'Brien"), ('br', "Conan O'Brien"),
+            ('o b', "Conan O'Brien"), ('m', 'Anne-Marie Roux'),
+            ('ma', 'Anne-Marie Roux'), ('e', 'Élodie Faure'),
+            ('el', 'Élodie Faure'), ('é', 'Élodie Faure')]:
+        assert(model.search_borrowers(typed) == [name])
+
+def test_search_after_import_and_delete(tmp_path):
+    database, model = setup()
+    path = write_file(tmp_path, 'borrowers.csv', 'name\nAmy\nAmanda\n')
+    model.import_borrowers(path)
+    assert(model.search_borrowers('am') == ['Amanda', 'Amy'])
+    with database.get_session() as session:
+        session.query(Borrower).filter_by(name='Amy').delete()
+        session.query(Borrower).filter_by(name='Amanda') \
+            .update({Borrower.name: 'Bea'})
+    assert(model.search_borrowers('am') == [])
+    assert(model.search_borrowers('be') == ['Bea'])
+
+def test_search_without_fts5():
+    database, model = setup()
+    setup_for_search(model)
+    texts = ['ad', 'SM', 'a a', 'ada smi', 'o"n', '%', 'dam', '', 'pen r',
+        'a', 'p blu']
+    expected = [
+        (model.search_borrowers(text), model.search_assets(text))
+        for text in texts
+    ]
+    database.name_search = False
+    assert([
+        (model.search_borrowers(text), model.search_assets(text))
+        for text in texts
+    ] == expected)
+
+def get_assets_from_database(database):
+    with database.get_session() as session:
+        return [
+            tuple(asset) for asset in
+            session.query(Asset.name, Asset.total, Asset.instock)
+            .order_by(Asset.name)
+        ]
+
+def test_inventory(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+    assert(model.get_assets() == get_assets_from_database(database))
+    model.add_asset(name='Pen', quantity=2)
+    model.add_asset(name='Eraser', quantity=4)
+    model.borrow_asset('Amy', 'Pen', 3, NEXT_DAY)
+    model.borrow_assets('Bob', [('Pen', 1), ('Eraser', 2)], NEXT_DAY)
+    model.return_assets('Bob', ['Eraser'])
+    model.return_asset('Amy', 'Pen')
+    model.remove_asset(name='Marker', quantity=1)
+    model.modify_asset_instock('Eraser', -1)
+    with pytest.raises(IntegrityError):
+        model.borrow_asset('Amy', 'Eraser', 10, NEXT_DAY)
+    with pytest.raises(NoResultFound):
+        model.return_asset('Cindy', 'Pen')
+    with pytest.raises(ValueError):
+        with model.batch():
+            model.borrow_asset('Cindy', 'Pen', 1, NEXT_DAY)
+            raise ValueError
+    path = write_file(tmp_path, 'assets.csv',
+        'name,quantity\nPen,1\nRuler,2\n')
+    model.import_assets(path)
+    path = write_file(tmp_path, 'loans.csv',
+        'borrower,asset,quantity,datedue,is_returned\n'
+        'Amy,Ruler,1,2030-01-01,false\nAmy,Pen,1,2030-01-01,true\n')
+    model.import_loans(path)
+    assert(model.get_assets() == get_assets_from_database(database))
+    assert(model.get_asset('Ruler') == ('Ruler', 2, 1))
+    with pytest.raises(NoResultFound):
+        model.get_asset('Stapler')
+
+def test_inventory_no_sql():
+    database, model = setup()
+    setup_for_loan(database)
+    model.get_assets()
+    statements = []
+    event.listen(
+        database.engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2])
+    )
+    assert(model.get_asset('Pen') == ('Pen', 10, 10))
+    model.get_assets(instock_only=True)
+    # only PRAGMA data_version, which bypasses the engine
+    assert(statements == [])
+
+def test_inventory_other_process(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    model = Model(Database(engine))
+    model.add_asset(name='Pen', quantity=10)
+    assert(model.get_asset('Pen') == ('Pen', 10, 10))
+
+    other = Model(Database(engine))
+    other.add_asset(name='Pen', quantity=5)
+    other.add_asset(name='Marker', quantity=1)
+
+    assert(model.get_asset('Pen') == ('Pen', 15, 15))
+    assert(model.get_assets() == [('Marker', 1, 1), ('Pen', 15, 15)])
+
+def test_inventory_uncommitted(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    model = Model(Database(engine))
+    model.add_asset(name='Pen', quantity=10)
+    assert(model.get_asset('Pen') == ('Pen', 10, 10))
+    seen = []
+
+    def read():
+        seen.append(model.get_asset('Pen'))
+
+    with model.batch():
+        model.add_asset(name='Pen', quantity=5)
+        model.add_asset(name='Marker', quantity=1)
+        assert(model.get_asset('Pen') == ('Pen', 15, 15))
+        assert(model.get_assets() == [('Marker', 1, 1), ('Pen', 15, 15)])
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        assert(seen == [('Pen', 10, 10)])
+    assert(model.get_asset('Pen') == ('Pen', 15, 15))
+
+    with pytest.raises(ValueError):
+        with model.batch():
+            model.add_asset(name='Pen', quantity=5)
+            raise ValueError
+    assert(model.get_assets() == [('Marker', 1, 1), ('Pen', 15, 15)])
+
+def test_inventory_apply_after_reload():
+    inventory = Inventory()
+    inventory.load([('Pen', 10, 10)])
+    inventory.apply(inventory.version, {'Pen': [5, 5]})
+    assert(inventory.get('Pen') == ('Pen', 15, 15))
+
+    # loaded again between the commit and apply, so it has the deltas
+    version = inventory.version
+    inventory.load([('Pen', 20, 20)])
+    inventory.apply(version, {'Pen': [5, 5]})
+    assert(not inventory.loaded)
+
+def test_loan_timestamps(tmp_path):
+    database, model = setup()
+    setup_for_loan(database)
+    before = datetime.now()
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.borrow_assets('Bob', [('Pen', 1), ('Marker', 1)], NEXT_DAY)
+    model.return_asset('Amy', 'Pen')
+    model.return_assets('Bob', ['Marker'])
+    after = datetime.now()
+    path = write_file(tmp_path, 'loans.csv',
+        'borrower,asset,quantity,datedue\nCindy,Pen,1,2030-01-01\n')
+    model.import_loans(path)
+
+    with database.get_session() as session:
+        loans = session.query(Loan).order_by(Loan.id).all()
+        times = [(loan.borrowed_at, loan.returned_at) for loan in loans]
+    for borrowed_at, _ in times[:3]:
+        assert(before <= borrowed_at <= after)
+    assert(before <= times[0][1] <= after)
+    assert(times[1][1] is None)
+    assert(before <= times[2][1] <= after)
+    assert(times[3] == (None, None))
+
+def test_get_loans_since_until():
+    database, model = setup()
+    setup_for_loan(database)
+    for quantity in (1, 2, 3):
+        model.borrow_asset('Amy', 'Pen', quantity, NEXT_DAY)
+    with database.get_session() as session:
+        for loan in session.query(Loan):
+            loan.borrowed_at = datetime(2020, 1, loan.quantity, 12)
+
+    def quantities(**kw):
+        return [loan[2] for loan in model.get_loans(**kw)]
+
+    assert(quantities(since=date(2020, 1, 2)) == [2, 3])
+    assert(quantities(until=date(2020, 1, 2)) == [1])
+    assert(quantities(since=datetime(2020, 1, 1, 13),
+        until=datetime(2020, 1, 3, 12)) == [2])
+    assert(quantities(since=date(2020, 1, 2), asset_name='Pen',
+        active_only=True) == [2, 3])
+    assert(quantities(since=date(2021, 1, 1)) == [])
+    page = model.get_loans_page(since=date(2020, 1, 2), limit=1, count=True)
+    assert(page.total == 2)
+    assert([loan[2] for loan in model.iter_loans(until=date(2020, 1, 3))]
+        == [1, 2])
+
+def test_get_assets_as_of():
+    database, model = setup()
+    model.add_borrower(name='Amy')
+    before = datetime.now()
+    time.sleep(0.01)
+    model.add_asset(name='Pen', quantity=5)
+    model.add_asset(name='Marker', quantity=2)
+    time.sleep(0.01)
+    added = datetime.now()
+    time.sleep(0.01)
+    model.borrow_assets('Amy', [('Pen', 2), ('Marker', 2)], NEXT_DAY)
+    time.sleep(0.01)
+    borrowed = datetime.now()
+    time.sleep(0.01)
+    model.return_asset('Amy', 'Pen')
+    model.remove_asset(name='Marker', quantity=0)
+    model.add_asset(name='Eraser', quantity=1)
+
+    assert(model.get_assets(as_of=before) == [])
+    assert(model.get_assets(as_of=added) == [('Marker', 2, 2), ('Pen', 5, 5)])
+    assert(model.get_assets(as_of=borrowed)
+        == [('Marker', 2, 0), ('Pen', 5, 3)])
+    assert(model.get_assets(instock_only=True, as_of=borrowed)
+        == [('Pen', 5, 3)])
+    assert(model.get_assets(as_of=datetime.now()) == model.get_assets())
+    assert(model.verify_ledger() == [])
+
+def test_ledger_snapshots():
+    database, model = setup()
+    model.add_asset(name='Pen', quantity=LEDGER_SNAPSHOT_INTERVAL)
+    model.add_asset(name='Marker', quantity=1)
+    with model.batch():
+        for _ in range(LEDGER_SNAPSHOT_INTERVAL):
+            model.modify_asset_instock('Pen', -1)
+    with database.get_session() as session:
+        snapshots = session.query(LedgerSnapshot).all()
+        assert(sorted((s.ledger_id, s.asset_id, s.total, s.instock)
+            for s in snapshots) == [
+                (LEDGER_SNAPSHOT_INTERVAL, 1, LEDGER_SNAPSHOT_INTERVAL, 2),
+                (LEDGER_SNAPSHOT_INTERVAL, 2, 1, 1),
+            ])
+    model.modify_asset_instock('Pen', 1)
+    assert(model.get_assets(as_of=datetime.now())
+        == [('Marker', 1, 1), ('Pen', LEDGER_SNAPSHOT_INTERVAL, 1)])
+    assert(model.verify_ledger() == [])
+
+    with database.get_session() as session:
+        session.query(LedgerSnapshot).filter_by(asset_id=2) \
+            .update({LedgerSnapshot.instock: 0})
+    assert(model.verify_ledger() == [('Marker', 1, 1, 1, 0)])
+
+def test_ledger_append_only():
+    database, model = setup()
+    model.add_asset(name='Pen', quantity=5)
+    with pytest.raises(IntegrityError):
+        with database.get_session() as session:
+            session.query(AssetLedger).delete()
+    with pytest.raises(IntegrityError):
+        with database.get_session() as session:
+            session.query(AssetLedger).update({AssetLedger.total_delta: 0})
+    with database.get_session() as session:
+        session.add(AssetLedger(
+            asset_id=1, at=datetime.now(), total_delta=1, instock_delta=0))
+    assert(model.verify_ledger() == [('Pen', 5, 5, 6, 5)])
+
+def test_get_availability_forecast():
+    database, model = setup()
+    setup_for_loan(database)
+    model.borrow_asset('Amy', 'Pen', 2, TODAY)
+    model.borrow_asset('Bob', 'Pen', 3, TODAY + timedelta(days=2))
+    model.borrow_asset('Cindy', 'Pen', 1, TODAY + timedelta(days=2))
+    model.borrow_asset('Cindy', 'Pen', 1, PREV_DAY)
+    model.borrow_asset('Amy', 'Marker', 1, TODAY + timedelta(days=5))
+    model.borrow_asset('Bob', 'Pen', 1, NEXT_DAY)
+    model.return_asset('Bob', 'Pen')
+
+    assert(model.get_availability_forecast('Pen', days=4) == [
+        (TODAY, 8),
+        (TODAY + timedelta(days=1), 8),
+        (TODAY + timedelta(days=2), 9),
+        (TODAY + timedelta(days=3), 9),
+    ])
+    assert(model.get_availability_forecast('Marker', days=5)
+        == [(TODAY + timedelta(days=i), 4) for i in range(5)])
+    with pytest.raises(NoResultFound):
+        model.get_availability_forecast('Eraser')
+
+def test_reserve():
+    database, model = setup()
+    setup_for_loan(database)
+    day = lambda n: TODAY + timedelta(days=n)
+    # Pen total 10: 4 out until day 3, 1 overdue
+    model.borrow_asset('Amy', 'Pen', 4, day(3))
+    model.borrow_asset('Bob', 'Pen', 1, PREV_DAY)
+
+    first = model.reserve('Cindy', 'Pen', 5, day(0), day(5))
+    with pytest.raises(IntegrityError):
+        model.reserve('Bob', 'Pen', 1, day(2), day(2))
+    # free again once the loan comes back on day 3
+    second = model.reserve('Bob', 'Pen', 4, day(3), day(10))
+    with pytest.raises(IntegrityError):
+        model.reserve('Amy', 'Pen', 1, day(5), day(6))
+    third = model.reserve('Amy', 'Pen', 5, day(6), day(6))
+    assert(model.get_reservations() == [
+        (first, 'Cindy', 'Pen', 5, day(0), day(5)),
+        (second, 'Bob', 'Pen', 4, day(3), day(10)),
+        (third, 'Amy', 'Pen', 5, day(6), day(6)),
+    ])
+    assert([r[0] for r in model.get_reservations(borrower_name='Bob')]
+        == [second])
+    assert([r[0] for r in model.get_reservations(since=day(6), until=day(6))]
+        == [second, third])
+    assert(model.get_reservations(asset_name='Marker') == [])
+
+    model.cancel_reservation(first)
+    model.reserve('Amy', 'Pen', 1, day(5), day(5))
+    with pytest.raises(NoResultFound):
+        model.cancel_reservation(first)
+
+def test_reserve_holds_back_loans():
+    database, model = setup()
+    setup_for_loan(database)
+    day = lambda n: TODAY + timedelta(days=n)
+    # Pen total 10: 6 reserved on days 2 to 4
+    reservation = model.reserve('Cindy', 'Pen', 6, day(2), day(4))
+
+    # due before the reservation starts, or only 4 out during it
+    model.borrow_asset('Amy', 'Pen', 5, day(2))
+    model.borrow_asset('Bob', 'Pen', 4, day(3))
+    with pytest.raises(IntegrityError):
+        model.borrow_asset('Amy', 'Pen', 1, day(3))
+    with pytest.raises(IntegrityError):
+        model.borrow_assets('Amy', [('Marker', 1), ('Pen', 1)], day(5))
+    with pytest.raises(IntegrityError):
+        model.remove_asset('Pen', 1)
+    assert(model.get_asset('Pen') == ('Pen', 10, 1))
+    assert(model.get_asset('Marker') == ('Marker', 5, 5))
+    assert(len(model.get_loans()) == 2)
+
+    model.return_asset('Amy', 'Pen')
+    model.borrow_assets('Amy', [('Marker', 1), ('Pen', 1)], day(2))
+    with pytest.raises(IntegrityError):
+        with model.batch():
+            model.return_asset('Bob', 'Pen')
+            model.remove_asset('Pen', 4)
+            model.remove_asset('Pen', 1)
+    assert(model.get_asset('Pen') == ('Pen', 10, 5))
+    model.cancel_reservation(reservation)
+    model.remove_asset('Pen', 5)
+    assert(model.get_asset('Pen') == ('Pen', 5, 0))
+
+def test_reserve_refused_in_batch():
+    database, model = setup()
+    setup_for_loan(database)
+    day = lambda n: TODAY + timedelta(days=n)
+
+    with model.batch():
+        model.reserve('Cindy', 'Pen', 6, day(2), day(4))
+        with pytest.raises(IntegrityError):
+            model.reserve('Bob', 'Pen', 5, day(3), day(3))
+        with pytest.raises(IntegrityError):
+            model.borrow_asset('Amy', 'Pen', 5, day(3))
+        model.borrow_asset('Amy', 'Pen', 2, day(3))
+
+    assert([r[1:4] for r in model.get_reservations()] == [('Cindy', 'Pen', 6)])
+    assert(model.get_loans() == [('Amy', 'Pen', 2, day(3), False)])
+    assert(model.get_asset('Pen') == ('Pen', 10, 8))
+    assert(model.get_outstanding_assets('Amy') == [('Pen', 2)])
+    # the refused reservation isn't held back in the index either
+    model.reserve('Bob', 'Pen', 2, day(3), day(3))
+
+def test_reserve_invalid():
+    database, model = setup()
+    setup_for_loan(database)
+    with pytest.raises(ValueError):
+        model.reserve('Amy', 'Pen', 0, TODAY, NEXT_DAY)
+    with pytest.raises(ValueError):
+        model.reserve('Amy', 'Pen', 1, NEXT_DAY, TODAY)
+    with pytest.raises(ValueError):
+        model.reserve('Amy', 'Pen', 1, PREV_DAY, NEXT_DAY)
+    with pytest.raises(NoResultFound):
+        model.reserve('Amy', 'Eraser', 1, TODAY, NEXT_DAY)
+    with pytest.raises(IntegrityError):
+        model.reserve('Amy', 'Pen', 11, TODAY, NEXT_DAY)
+    assert(model.get_reservations() == [])
+
+def test_reserve_other_process(tmp_path):
+    engine = 'sqlite:///' + str(tmp_path / 'equipmentmanagement.db')
+    database = Database(engine)
+    model = Model(database)
+    setup_for_loan(database)
+    other = Model(Database(engine))
+    model.reserve('Amy', 'Marker', 3, TODAY, NEXT_DAY)
+    other.reserve('Bob', 'Marker', 2, NEXT_DAY, NEXT_DAY)
+    with pytest.raises(IntegrityError):
+        model.reserve('Cindy', 'Marker', 1, NEXT_DAY, NEXT_DAY)
+    model.reserve('Cindy', 'Marker', 2, TODAY, TODAY)
+
+def test_reservation_index_peak():
+    _, model = setup()
+    index = model.reservations
+    index.load([])
+    rng = random.Random(0)
+    demand = defaultdict(int)
+    ids = {}
+    for reservation_id in range(300):
+        first = TODAY + timedelta(days=rng.randint(0, 30))
+        last = first + timedelta(days=rng.randint(0, 10))
+        quantity = rng.randint(1, 3)
+        index.add(reservation_id, 1, first, last, quantity)
+        ids[reservation_id] = (first, last, quantity)
+        if rng.random() < 0.3:
+            removed = rng.choice(list(ids))
+            index.remove(removed)
+            ids.pop(removed)
+    for first, last, quantity in ids.values():
+        for n in range((last - first).days + 1):
+            demand[first + timedelta(days=n)] += quantity
+    for _ in range(200):
+        first = TODAY + timedelta(days=rng.randint(-5, 45))
+        last = first + timedelta(days=rng.randint(0, 15))
+        changes = sorted(
+            (first + timedelta(days=rng.randint(1, 15)), -1)
+            for _ in range(rng.randint(0, 3)))
+        base = len(changes)
+        expected = max(
+            demand[first + timedelta(days=n)] + base - sum(
+                1 for day, _ in changes if day <= first + timedelta(days=n))
+            for n in range((last - first).days + 1))
+        assert(index.get_peak(1, first, last, base,
+            [change for change in changes if change[0] <= last]) == expected)
+    assert(index.get_peak(2, TODAY, NEXT_DAY) == 0)
+
+def test_archive_loans():
+    database, model = setup()
+    setup_for_loan(database)
+    for quantity in (1, 2, 3, 4):
+        model.borrow_asset('Amy', 'Pen', quantity, NEXT_DAY)
+    model.return_asset('Amy', 'Pen')
+    model.borrow_asset('Bob', 'Pen', 5, PREV_DAY)
+    model.borrow_asset('Cindy', 'Marker', 1, NEXT_DAY)
+    model.return_asset('Cindy', 'Marker')
+    with database.get_session() as session:
+        session.query(Loan).filter(Loan.quantity < 4) \
+            .update({Loan.returned_at: datetime(2020, 1, 1)})
+        # returned before return times were recorded
+        session.query(Loan).filter(Loan.quantity == 4) \
+            .update({Loan.returned_at: None, Loan.datedue: date(2020, 1, 1)})
+    everything = model.get_loans()
+
+    assert(model.archive_loans(chunk_size=2) == 4)
+    assert(model.archive_loans() == 0)
+    with database.get_session() as session:
+        assert(sorted(loan.quantity for loan in session.query(LoanArchive))
+            == [1, 2, 3, 4])
+    assert(model.get_loans() == [
+        ('Bob', 'Pen', 5, PREV_DAY, False),
+        ('Cindy', 'Marker', 1, NEXT_DAY, True),
+    ])
+    assert(model.get_loans(include_archived=True) == everything)
+    assert(model.get_loans(active_only=True, include_archived=True)
+        == [('Bob', 'Pen', 5, PREV_DAY, False)])
+    assert([loan[2] for loan in model.get_loans(
+        borrower_name='Amy', include_archived=True)] == [1, 2, 3, 4])
+    assert(list(model.iter_loans(include_archived=True)) == everything)
+
+    loans = []
+    cursor = None
+    while True:
+        page = model.get_loans_page(
+            after=cursor, limit=4, count=True, include_archived=True)
+        assert(page.total == 6)
+        loans += page.loans
+        cursor = page.cursor
+        if cursor is None:
+            break
+    assert(loans == everything)
+    assert(model.get_loans_page(count=True).total == 2)
+
+def test_archive_loans_keeps_newest():
+    database, model = setup()
+    setup_for_loan(database)
+    model.borrow_asset('Amy', 'Pen', 1, NEXT_DAY)
+    model.borrow_asset('Amy', 'Pen', 2, NEXT_DAY)
+    model.return_asset('Amy', 'Pen')
+
+    assert(model.archive_loans(age=timedelta(0)) == 1)
+    model.borrow_asset('Bob', 'Pen', 3, NEXT_DAY)
+    with database.get_session() as session:
+        assert(sorted(loan.id for loan in session.query(Loan)) == [2, 3])
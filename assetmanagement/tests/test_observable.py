@@ -0,0 +1,320 @@
+import copy
+import gc
+import os
+import threading
+import tracemalloc
+import weakref
+
+import pytest
+
+from assetmanagement.src.observable import (NotificationDispatcher,
+                                            coalesce_notifications,
+                                            deferred_notifications,
+                                            dispatch_notifications,
+                                            flush_notifications,
+                                            get_notification_stats,
+                                            observable_method,
+                                            wait_for_notifications)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    @observable_method()
+    def add(self, amount):
+        self.value += amount
+
+    @observable_method()
+    def reset(self):
+        self.value = 0
+
+
+class AsyncCounter(Counter):
+    @observable_method(dispatch='async')
+    def add(self, amount):
+        self.value += amount
+
+
+class View:
+    def __init__(self):
+        self.refreshes = 0
+        self.amounts = []
+
+    def refresh(self):
+        self.refreshes += 1
+
+    def update(self, amount):
+        self.amounts.append(amount)
+
+
+def setup():
+    counter = Counter()
+    view = View()
+    counter.add.add_observer(view.refresh, pass_arguments=False)
+    counter.reset.add_observer(view.refresh, pass_arguments=False)
+    return counter, view
+
+def test_deferred_notifications():
+    counter, view = setup()
+
+    with deferred_notifications(counter):
+        counter.add(1)
+        counter.reset()
+        assert(view.refreshes == 0)
+
+    assert(view.refreshes == 2)
+
+def test_deferred_notifications_coalesce():
+    counter, view = setup()
+    counter.add.add_observer(view.update)
+
+    with deferred_notifications(counter, coalesce=True):
+        counter.add(1)
+        counter.add(2)
+        counter.reset()
+        counter.add(3)
+
+    assert(view.refreshes == 1)
+    assert(view.amounts == [1, 2, 3])
+    stats = get_notification_stats(counter)
+    assert(stats.delivered == 4)
+    assert(stats.coalesced == 3)
+
+def test_deferred_notifications_raise():
+    counter, view = setup()
+
+    with pytest.raises(ValueError):
+        with deferred_notifications(counter, coalesce=True):
+            counter.add(1)
+            raise ValueError
+
+    assert(view.refreshes == 0)
+    counter.add(1)
+    assert(view.refreshes == 1)
+
+def test_coalesce_notifications():
+    counter, view = setup()
+    scheduled = []
+    coalesce_notifications(counter, scheduled.append)
+
+    counter.add(1)
+    counter.add(2)
+    with deferred_notifications(counter, coalesce=True):
+        counter.reset()
+    assert(view.refreshes == 0)
+    assert(len(scheduled) == 1)
+
+    scheduled.pop()()
+    assert(view.refreshes == 1)
+    assert(get_notification_stats(counter).coalesced == 2)
+
+    # the next tick starts a new queue
+    counter.add(1)
+    assert(len(scheduled) == 1)
+    flush_notifications(counter)
+    assert(view.refreshes == 2)
+    # flushing twice delivers nothing twice
+    scheduled.pop()()
+    assert(view.refreshes == 2)
+
+def test_coalesce_notifications_stop():
+    counter, view = setup()
+    scheduled = []
+    coalesce_notifications(counter, scheduled.append)
+    counter.add(1)
+
+    coalesce_notifications(counter, None)
+    assert(view.refreshes == 1)
+    counter.add(1)
+    assert(view.refreshes == 2)
+    assert(len(scheduled) == 1)
+
+def test_observer_snapshot():
+    counter, view = setup()
+    other = View()
+    snapshot = counter.add.observers.snapshot()
+    assert(counter.add.observers.snapshot() is snapshot)
+
+    counter.add.add_observer(other.update)
+    counter.add(1)
+    assert((view.refreshes, other.amounts) == (1, [1]))
+
+    counter.add.discard_observer(view.refresh)
+    counter.add(2)
+    assert((view.refreshes, other.amounts) == (1, [1, 2]))
+
+def test_observer_dispatch():
+    counter = Counter()
+    calls = []
+    counter.add.add_observer(
+        lambda observed, amount: calls.append((observed.inst, amount)),
+        identify_observed=True)
+    counter.add.add_observer(
+        lambda observed, changes, amount: calls.append((changes, amount)),
+        identify_observed=True, pass_changes=True)
+
+    counter.add(amount=3)
+
+    assert(calls == [(counter, 3), ((), 3)])
+
+def test_observer_instance_dies():
+    counter, view = setup()
+    other = View()
+    counter.add.add_observer(other.update)
+    del view
+
+    counter.add(1)
+
+    assert(len(counter.add.observers) == 1)
+    assert(other.amounts == [1])
+
+def test_observable_method_cached():
+    counter, view = setup()
+    add = counter.add
+    assert(counter.add is add)
+    assert(Counter.add(counter, 1) is None)
+    assert(counter.add is add)
+    assert(view.refreshes == 1)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        methods = [counter.add for _ in range(1000)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = [
+        stat for stat in after.compare_to(before, 'filename')
+        if os.path.basename(stat.traceback[0].filename) == 'observable.py'
+    ]
+    assert(sum(stat.count_diff for stat in allocated) == 0)
+    assert(all(method is add for method in methods))
+
+def test_observable_method_cached_lifetime():
+    counter, view = setup()
+    counter.add(1)
+    add = counter.add
+    counter_wr = weakref.ref(counter)
+    view_wr = weakref.ref(view)
+
+    # freed by reference counting, without the garbage collector
+    gc.disable()
+    try:
+        del counter
+        assert(counter_wr() is None)
+        with pytest.raises(ReferenceError):
+            add(1)
+
+        # the observer doesn't keep its instance alive either
+        del view
+        assert(view_wr() is None)
+    finally:
+        gc.enable()
+
+def test_observable_method_cached_assign():
+    counter, view = setup()
+    with pytest.raises(RuntimeError):
+        counter.add = print
+    counter.add(1)
+    assert(view.refreshes == 1)
+
+def test_observable_method_cached_copy():
+    counter, view = setup()
+    add = counter.add
+    other = copy.copy(counter)
+
+    assert(other.add is not add)
+    assert(other.add.inst is other)
+    assert(counter.add is add)
+    other.add(2)
+    assert((counter.value, other.value) == (0, 2))
+
+def test_dispatch_notifications():
+    counter, view = setup()
+    dispatcher = NotificationDispatcher()
+    dispatch_notifications(counter, dispatcher)
+    release = threading.Event()
+    threads = []
+    counter.add.add_observer(
+        lambda amount: threads.append(threading.get_ident()) or release.wait())
+
+    for amount in range(1, 6):
+        counter.add(amount)
+    # the calls returned while the first observer is still waiting
+    assert(counter.value == 15)
+    release.set()
+    assert(wait_for_notifications(counter, timeout=10))
+
+    assert(view.refreshes == 5)
+    assert(len(threads) == 5)
+    assert(threading.get_ident() not in threads)
+    dispatch_notifications(counter, None)
+    counter.add(1)
+    assert(view.refreshes == 6)
+    dispatcher.shutdown()
+
+def test_dispatch_notifications_order():
+    counter = AsyncCounter()
+    view = View()
+    counter.add.add_observer(view.update)
+
+    for amount in range(100):
+        counter.add(amount)
+    wait_for_notifications(counter)
+
+    assert(view.amounts == list(range(100)))
+
+def test_dispatch_notifications_errors():
+    counter, view = setup()
+    errors = []
+    dispatcher = NotificationDispatcher(
+        on_error=lambda observer, exception: errors.append(exception))
+    dispatch_notifications(counter, dispatcher)
+    counter.add.add_observer(lambda: 1 / 0, pass_arguments=False)
+    counter.add.add_observer(view.update)
+
+    counter.add(1)
+    counter.add(2)
+    wait_for_notifications(counter)
+
+    assert(view.refreshes == 2)
+    assert(view.amounts == [1, 2])
+    assert(dispatcher.failed == 2)
+    assert(all(isinstance(error, ZeroDivisionError) for error in errors))
+    assert([error for _, error in dispatcher.errors] == errors)
+    dispatcher.shutdown()
+
+def test_dispatch_notifications_batch():
+    counter, view = setup()
+    submitted = []
+
+    class Executor:
+        # never runs anything, like an event loop that isn't turning
+        def submit(self, function):
+            submitted.append(function)
+
+    dispatch_notifications(counter, NotificationDispatcher(Executor()))
+    with deferred_notifications(counter, coalesce=True):
+        counter.add(1)
+        counter.reset()
+    assert(view.refreshes == 0)
+    assert(len(submitted) == 1)
+
+    # flush delivers on the calling thread what nobody started on
+    assert(wait_for_notifications(counter))
+    assert(view.refreshes == 1)
+    submitted.pop()()
+    assert(view.refreshes == 1)
+
+def test_dispatch_notifications_flush_from_observer():
+    counter, view = setup()
+    dispatcher = NotificationDispatcher()
+    dispatch_notifications(counter, dispatcher)
+    counter.add.add_observer(dispatcher.flush, pass_arguments=False)
+
+    counter.add(1)
+    wait_for_notifications(counter)
+
+    assert(isinstance(dispatcher.errors[0][1], RuntimeError))
+    dispatcher.shutdown()